@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Many actors with the Player physics, stepped together. Positions,
+# velocities and onGround flags live in NumPy arrays, one slot per actor,
+# and tile collisions are resolved against a boolean grid of the level for
+# all actors at once. For any single actor the result matches
+# Player.update against TileGrid(level, merge=False) tick for tick.
+
+import numpy as np
+from pygame import Rect
+
+from tiles import TILES, PLATFORM_WIDTH, PLATFORM_HEIGHT
+from physics import WIDTH, HEIGHT, MOVE_SPEED, JUMP_POWER, GRAVITY
+
+CAPACITY = 64
+
+
+def solid_grid(level):
+    # level cells as a (height, width) bool array, True where solid
+    solid = np.zeros(256, dtype=bool)
+    solid[[ord(c) for c in TILES]] = True
+    cells = np.frombuffer(bytes(level.cells), dtype=np.uint8)
+    return solid[cells].reshape(level.height, level.width)
+
+
+def round_position(value):
+    # Rect attributes round floats half away from zero; do the same.
+    return np.where(value >= 0, np.floor(value + 0.5), np.ceil(value - 0.5)).astype(np.int64)
+
+
+class ActorSystem(object):
+    def __init__(self, level, width=WIDTH, height=HEIGHT, capacity=CAPACITY):
+        self.grid = solid_grid(level)
+        self.gridFlat = self.grid.ravel()
+        self.width = width
+        self.height = height
+        self.count = 0
+        self._allocate(capacity)
+        # the most cells an actor rect can overlap in each direction
+        self._rows = np.arange((height + PLATFORM_HEIGHT - 1) // PLATFORM_HEIGHT + 1)
+        self._cols = np.arange((width + PLATFORM_WIDTH - 1) // PLATFORM_WIDTH + 1)
+
+    def _allocate(self, capacity):
+        def grow(old, dtype):
+            new = np.zeros(capacity, dtype=dtype)
+            if old is not None:
+                new[:self.count] = old[:self.count]
+            return new
+        self.x = grow(getattr(self, "x", None), np.int64)
+        self.y = grow(getattr(self, "y", None), np.int64)
+        self.xvel = grow(getattr(self, "xvel", None), np.int64)
+        self.yvel = grow(getattr(self, "yvel", None), np.float64)
+        self.onGround = grow(getattr(self, "onGround", None), bool)
+        self.capacity = capacity
+
+    def spawn(self, x, y):
+        # Adds an actor standing still at (x, y) and returns its index.
+        if self.count == self.capacity:
+            self._allocate(self.capacity * 2)
+        i = self.count
+        self.x[i], self.y[i] = x, y
+        self.xvel[i] = 0
+        self.yvel[i] = 0.0
+        self.onGround[i] = False
+        self.count += 1
+        return i
+
+    def rect(self, i):
+        return Rect(int(self.x[i]), int(self.y[i]), self.width, self.height)
+
+    def update(self, left, right, up):
+        # left/right/up are bools or per-actor bool arrays.
+        n = self.count
+        x, y = self.x[:n], self.y[:n]
+        xvel, yvel, onGround = self.xvel[:n], self.yvel[:n], self.onGround[:n]
+        left = np.broadcast_to(np.asarray(left, dtype=bool), (n,))
+        right = np.broadcast_to(np.asarray(right, dtype=bool), (n,))
+        up = np.broadcast_to(np.asarray(up, dtype=bool), (n,))
+
+        yvel[up & onGround] = -JUMP_POWER
+        xvel[:] = np.where(right, MOVE_SPEED, np.where(left, -MOVE_SPEED, 0))
+        yvel[~onGround] += GRAVITY
+
+        onGround[:] = False
+        y[:] = round_position(y + yvel)
+        self._collide(np.zeros(n, dtype=np.int64), yvel.copy())
+
+        x += xvel
+        self._collide(xvel.copy(), np.zeros(n))
+
+    def _collide(self, xvel, yvel):
+        # Player.collide for every actor: walk the solid cells under each
+        # rect in row-major order, resolving the first one past the last hit
+        # and re-testing against the moved rect, until none is left.
+        n = self.count
+        x, y = self.x[:n], self.y[:n]
+        gh, gw = self.grid.shape
+        last = np.full(n, -1, dtype=np.int64)
+        # last only grows, so this ends after at most one pass per grid cell
+        while True:
+            left = np.maximum(0, x // PLATFORM_WIDTH)
+            right = np.minimum(gw - 1, (x + self.width - 1) // PLATFORM_WIDTH)
+            top = np.maximum(0, y // PLATFORM_HEIGHT)
+            bottom = np.minimum(gh - 1, (y + self.height - 1) // PLATFORM_HEIGHT)
+            rows = top[:, None] + self._rows
+            cols = left[:, None] + self._cols
+            inside = (rows <= bottom[:, None])[:, :, None] & (cols <= right[:, None])[:, None, :]
+            index = rows[:, :, None] * gw + cols[:, None, :]
+            hits = inside & self.gridFlat[np.minimum(index, gh * gw - 1)] & (index > last[:, None, None])
+            hits = hits.reshape(n, -1)
+            found = hits.any(axis=1)
+            if not found.any():
+                return
+            cell = index.reshape(n, -1)[np.arange(n), hits.argmax(axis=1)]
+            cy, cx = np.divmod(cell, gw)
+            last = np.where(found, cell, last)
+
+            hit = found & (xvel > 0)
+            x[hit] = cx[hit] * PLATFORM_WIDTH - self.width
+            hit = found & (xvel < 0)
+            x[hit] = (cx[hit] + 1) * PLATFORM_WIDTH
+            hit = found & (yvel > 0)
+            y[hit] = cy[hit] * PLATFORM_HEIGHT - self.height
+            self.onGround[:n][hit] = True
+            self.yvel[:n][hit] = 0
+            hit = found & (yvel < 0)
+            y[hit] = (cy[hit] + 1) * PLATFORM_HEIGHT
+            self.yvel[:n][hit] = 0
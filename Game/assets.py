@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import mmap
+import os
+import threading
+from pygame import Rect, display, error, image
+
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+BAKE_DIR = os.path.join(ASSET_DIR, "baked")
+BAKE_MANIFEST = "manifest.json"
+BAKE_VERSION = 1
+BAKE_FORMAT = "RGBA"
+
+
+class AssetRegistry(object):
+    # Loads every image file once and hands out the same Surface to all
+    # sprites. Surfaces are converted to the display pixel format as soon
+    # as a display exists, which makes blitting them much cheaper.
+    #
+    # If bake.py has been run, images are mapped from its raw pixel blobs
+    # instead of being decoded; sources changed since the bake are decoded
+    # as usual.
+    #
+    # decode() may be called from worker threads (see preload.py); only
+    # image() and store() touch the cache and must stay on the main thread.
+    def __init__(self, bake_dir=BAKE_DIR):
+        self._images = {}
+        self.hits = 0
+        self.misses = 0
+        self.baked = 0
+        self.bake_dir = bake_dir
+        self._manifest = None
+        self._blobs = {}
+        self._lock = threading.Lock()
+
+    def image(self, path, alpha=True):
+        key = (os.path.normpath(path), alpha)
+        entry = self._images.get(key)
+        if entry is None:
+            self.misses += 1
+            entry = [self.decode(key[0]), False]
+            self._images[key] = entry
+        else:
+            self.hits += 1
+        if not entry[1] and display.get_surface() is not None:
+            entry[0] = entry[0].convert_alpha() if alpha else entry[0].convert()
+            entry[1] = True
+        return entry[0]
+
+    def store(self, path, surface, alpha=True):
+        # Hands the registry a Surface decoded elsewhere, e.g. by a preloader.
+        key = (os.path.normpath(path), alpha)
+        if key not in self._images:
+            self.misses += 1
+            self._images[key] = [surface, False]
+
+    def decode(self, path):
+        with self._lock:
+            baked = self._baked(path)
+            if baked is not None:
+                self.baked += 1
+                return baked
+        return image.load(path)
+
+    def _baked(self, path):
+        if self._manifest is None:
+            self._manifest = {}
+            try:
+                with open(os.path.join(self.bake_dir, BAKE_MANIFEST)) as f:
+                    manifest = json.load(f)
+                if manifest.get("version") == BAKE_VERSION and manifest.get("format") == BAKE_FORMAT:
+                    self._manifest = manifest["images"]
+            except (OSError, ValueError, KeyError):
+                pass
+        rel = os.path.relpath(os.path.abspath(path), ASSET_DIR).replace(os.sep, "/")
+        info = self._manifest.get(rel)
+        if info is None:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if st.st_mtime != info["mtime"] or st.st_size != info["bytes"]:
+            return None
+
+        blob = self._blobs.get(info["blob"])
+        if blob is None:
+            # a private copy-on-write mapping: callers may draw on the
+            # Surfaces they get, and a read-only one would crash on it
+            try:
+                with open(os.path.join(self.bake_dir, info["blob"]), "rb") as f:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+            except (OSError, ValueError):
+                return None
+            size = tuple(info["blobSize"])
+            if len(data) != size[0] * size[1] * 4:
+                data.close()
+                return None
+            try:
+                blob = (data, image.frombuffer(data, size, BAKE_FORMAT))
+            except (error, ValueError):
+                data.close()
+                return None
+            self._blobs[info["blob"]] = blob
+        try:
+            return blob[1].subsurface(Rect(info["rect"]))
+        except (error, ValueError):
+            return None
+
+    def clear(self):
+        self._images.clear()
+        self._blobs.clear()
+        self._manifest = None
+
+    def stats(self):
+        return {"images": len(self._images), "hits": self.hits, "misses": self.misses,
+                "baked": self.baked}
+
+    def __repr__(self):
+        return "<AssetRegistry %d images, %d hits, %d misses, %d baked>" % (
+            len(self._images), self.hits, self.misses, self.baked)
+
+
+registry = AssetRegistry()
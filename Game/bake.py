@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Offline asset bake. Decodes the PNGs under ASSET_DIRS in a process pool,
+# normalises them to 32-bit RGBA and writes ready-to-blit raw pixel blobs
+# plus a manifest into BAKE_DIR. AssetRegistry maps those blobs straight
+# into Surfaces at runtime instead of decoding the PNGs.
+#
+#     python bake.py             # one blob per image
+#     python bake.py --atlas     # one atlas blob per asset directory
+#
+# Only assets whose source hash changed are decoded again.
+
+import os
+os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+
+import argparse
+import hashlib
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+ASSET_DIRS = ("player", "blocks")
+BAKE_DIR = os.path.join(ROOT, "baked")
+MANIFEST = "manifest.json"
+VERSION = 1
+FORMAT = "RGBA"
+ATLAS_WIDTH = 1024
+
+
+def source_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def decode(path):
+    # Runs in a worker process.
+    import pygame
+    surf = pygame.image.load(path)
+    return surf.get_size(), pygame.image.tobytes(surf, FORMAT)
+
+
+def pack(sizes, width=ATLAS_WIDTH):
+    # Shelf packing, tallest first. Returns the atlas size and one (x, y)
+    # per input size.
+    order = sorted(range(len(sizes)), key=lambda i: -sizes[i][1])
+    width = max([min(width, sum(w for w, h in sizes))] + [w for w, h in sizes])
+    positions = [None] * len(sizes)
+    x = y = shelf = 0
+    for i in order:
+        w, h = sizes[i]
+        if x + w > width:
+            x, y, shelf = 0, y + shelf, 0
+        positions[i] = (x, y)
+        x += w
+        shelf = max(shelf, h)
+    return (width, y + shelf), positions
+
+
+def load_manifest(out=BAKE_DIR):
+    try:
+        with open(os.path.join(out, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != VERSION or manifest.get("format") != FORMAT:
+        return None
+    return manifest
+
+
+def find_sources(dirs=ASSET_DIRS):
+    sources = []
+    for d in dirs:
+        for name in sorted(os.listdir(os.path.join(ROOT, d))):
+            if name.lower().endswith(".png"):
+                sources.append("%s/%s" % (d, name))
+    return sources
+
+
+def bake(dirs=ASSET_DIRS, out=BAKE_DIR, atlas=False, jobs=None, force=False):
+    # Returns (rebuilt, reused) blob counts.
+    old = (load_manifest(out) or {}).get("images", {}) if not force else {}
+    sources = find_sources(dirs)
+    hashes = dict((src, source_hash(os.path.join(ROOT, src))) for src in sources)
+
+    # every blob is rebuilt from all its members, so group sources by blob
+    groups = {}
+    for src in sources:
+        blob = (os.path.dirname(src) if atlas else src.replace("/", "_").rsplit(".", 1)[0]) + ".rgba"
+        groups.setdefault(blob, []).append(src)
+
+    stale = []
+    for blob, members in sorted(groups.items()):
+        fresh = os.path.exists(os.path.join(out, blob)) and all(
+            src in old and old[src]["sha1"] == hashes[src] and old[src]["blob"] == blob
+            for src in members)
+        if not fresh:
+            stale.append(blob)
+
+    images = {}
+    for blob, members in groups.items():
+        if blob in stale:
+            continue
+        for src in members:
+            # unchanged content; just refresh what the runtime checks
+            st = os.stat(os.path.join(ROOT, src))
+            images[src] = dict(old[src], mtime=st.st_mtime, bytes=st.st_size)
+    decode_list = [src for blob in stale for src in groups[blob]]
+    if not os.path.isdir(out):
+        os.makedirs(out)
+    if decode_list:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            decoded = dict(zip(decode_list, pool.map(decode, [os.path.join(ROOT, s) for s in decode_list])))
+    for blob in stale:
+        members = groups[blob]
+        sizes = [decoded[src][0] for src in members]
+        (bw, bh), positions = pack(sizes) if len(members) > 1 else (sizes[0], [(0, 0)])
+        pixels = bytearray(bw * bh * 4)
+        for src, (w, h), (x, y) in zip(members, sizes, positions):
+            data = decoded[src][1]
+            for row in range(h):
+                start = ((y + row) * bw + x) * 4
+                pixels[start:start + w * 4] = data[row * w * 4:(row + 1) * w * 4]
+            st = os.stat(os.path.join(ROOT, src))
+            images[src] = {"sha1": hashes[src], "mtime": st.st_mtime, "bytes": st.st_size,
+                           "blob": blob, "blobSize": [bw, bh], "rect": [x, y, w, h]}
+        tmp = os.path.join(out, blob + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(pixels)
+        os.replace(tmp, os.path.join(out, blob))
+
+    for blob in set(os.listdir(out)) - set(groups) - {MANIFEST}:
+        if blob.endswith(".rgba"):
+            os.remove(os.path.join(out, blob))
+    manifest = {"version": VERSION, "format": FORMAT, "images": images}
+    tmp = os.path.join(out, MANIFEST + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, os.path.join(out, MANIFEST))
+    return len(stale), len(groups) - len(stale)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bake image assets into raw pixel blobs.")
+    parser.add_argument("--atlas", action="store_true", help="pack each asset directory into one atlas")
+    parser.add_argument("--jobs", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true", help="rebuild everything")
+    parser.add_argument("--out", default=BAKE_DIR)
+    args = parser.parse_args()
+    start = time.time()
+    rebuilt, reused = bake(out=args.out, atlas=args.atlas, jobs=args.jobs, force=args.force)
+    print("baked %d blobs, %d up to date, in %.2fs" % (rebuilt, reused, time.time() - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Reproducible benchmarks for level construction, player physics,
+# animation and full-frame rendering over synthetic levels of increasing
+# size. Results are written as JSON so runs can be diffed between versions:
+#
+#     python benchmark.py --out bench.json
+#     python benchmark.py --sizes 64 256 --repeat 3
+
+import os
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+os.environ["SDL_AUDIODRIVER"] = "dummy"
+os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+import pygame
+import pyganim
+import levelfile
+import platformer
+from platformer import Camera, camera_configure, load_platforms, draw, DISPLAY, BACKGROUND_COLOR
+from player import Player, ANIMATION_RIGHT, ANIMATION_DELAY, load_frames
+from blocks import PLATFORM_WIDTH, PLATFORM_HEIGHT
+from spatial import SpatialHash
+from headless import random_inputs
+
+SIZES = (64, 128, 256, 512)
+REPEAT = 5
+TICKS = 600
+FRAMES = 120
+CALLS = 10000
+SEED = 1234
+HERO_CELL = (3, 3)
+
+
+def synthetic_level(size, seed=SEED):
+    # size x size cells: a walled box with random ledges, roughly the
+    # density of levels/level1.txt. The same seed always gives the same level.
+    rnd = random.Random(seed)
+    rows = ["^" * size]
+    for y in range(1, size - 1):
+        row = [" "] * size
+        row[0], row[-1] = ">", "<"
+        if y % 4 == 0:
+            x = rnd.randrange(1, size - 1)
+            for i in range(x, min(size - 1, x + rnd.randrange(2, 9))):
+                row[i] = "-"
+        rows.append("".join(row))
+    rows.append("*" * size)
+    return rows
+
+
+def measure(func, repeat, number):
+    # Best and median per-call time in seconds over repeat runs of number calls.
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(number)
+        times.append((time.perf_counter() - start) / number)
+    times.sort()
+    return {"best": times[0], "median": times[len(times) // 2], "repeat": repeat, "number": number}
+
+
+def bench_construction(rows, repeat):
+    def build(number):
+        for _ in range(number):
+            level = levelfile.Level.from_rows(rows)
+            load_platforms(level, pygame.sprite.Group())
+    return measure(build, repeat, 1)
+
+
+def bench_player(level, repeat):
+    platforms, _ = load_platforms(level)
+    start = (HERO_CELL[0] * PLATFORM_WIDTH, HERO_CELL[1] * PLATFORM_HEIGHT)
+    inputs = list(zip(range(TICKS), random_inputs(SEED)))
+
+    def update(animate):
+        def run(number):
+            hero = Player(start[0], start[1], animate=animate)
+            for _, (left, right, up) in inputs[:number]:
+                hero.update(left, right, up, platforms)
+        return run
+
+    def collide(number):
+        hero = Player(start[0], start[1], animate=False)
+        for _ in range(number):
+            hero.collide(0, 1, platforms)
+            hero.collide(1, 0, platforms)
+
+    return {
+        "update": measure(update(False), repeat, TICKS),
+        "update_animated": measure(update(True), repeat, TICKS),
+        "collide": measure(collide, repeat, TICKS),
+    }
+
+
+def bench_animation(repeat):
+    anim = pyganim.PygAnimation(load_frames([(f, ANIMATION_DELAY) for f in ANIMATION_RIGHT]))
+    anim.play()
+    dest = pygame.Surface(anim.getMaxSize())
+    startTimes = anim._startTimes
+    end = startTimes[-1]
+
+    def blit(number):
+        for _ in range(number):
+            anim.blit(dest, (0, 0))
+
+    def find(number):
+        for i in range(number):
+            pyganim.findStartTime(startTimes, (i % 97) * end / 97.0)
+
+    return {"blit": measure(blit, repeat, CALLS), "findStartTime": measure(find, repeat, CALLS)}
+
+
+def bench_frame(level, screen, repeat):
+    entities = pygame.sprite.Group()
+    platforms, layer = load_platforms(level, entities)
+    hero = Player(HERO_CELL[0] * PLATFORM_WIDTH, HERO_CELL[1] * PLATFORM_HEIGHT)
+    entities.add(hero)
+    sprites = SpatialHash()
+    for e in entities:
+        sprites.add(e, dynamic=e is hero)
+    camera = Camera(camera_configure, level.width * PLATFORM_WIDTH, level.height * PLATFORM_HEIGHT)
+    bg = pygame.Surface(DISPLAY)
+    bg.fill(pygame.Color(BACKGROUND_COLOR))
+    inputs = list(zip(range(FRAMES), random_inputs(SEED)))
+
+    def run(number):
+        for _, (left, right, up) in inputs[:number]:
+            camera.update(hero)
+            platforms.update(hero.rect)
+            hero.update(left, right, up, platforms)
+            sprites.move(hero)
+            draw(screen, bg, camera, layer, sprites)
+            pygame.display.update()
+
+    return measure(run, repeat, FRAMES)
+
+
+def run(sizes=SIZES, repeat=REPEAT):
+    pygame.display.init()
+    screen = pygame.display.set_mode(DISPLAY)
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "platform": platform.platform(),
+            "bake_static": platformer.BAKE_STATIC,
+            "seed": SEED,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "animation": bench_animation(repeat),
+        "levels": [],
+    }
+    for size in sizes:
+        rows = synthetic_level(size)
+        level = levelfile.Level.from_rows(rows)
+        results["levels"].append({
+            "size": size,
+            "tiles": sum(1 for _ in level.solid_cells()),
+            "construction": bench_construction(rows, repeat),
+            "player": bench_player(level, repeat),
+            "frame": bench_frame(level, screen, repeat),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the frame loop, collision and animation.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="level sizes in cells per side")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat)
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
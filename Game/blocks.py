@@ -1,55 +1,46 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from pygame import *
+from pygame import Rect, sprite
+from assets import registry
+from tiles import PLATFORM_WIDTH, PLATFORM_HEIGHT, PLATFORM_COLOR, TILES
 import os
 
-PLATFORM_WIDTH = 32
-PLATFORM_HEIGHT = 32
-PLATFORM_COLOR = "#FF6262"
 ICON_DIR = os.path.dirname(__file__)
 
 
 class Platform(sprite.Sprite):
+    IMAGE = "%s/%s" % (ICON_DIR, TILES["-"])
+
     def __init__(self, x, y):
         sprite.Sprite.__init__(self)
-        self.image = Surface((PLATFORM_WIDTH, PLATFORM_HEIGHT))
-        self.image.fill(Color(PLATFORM_COLOR))
-        self.image = image.load("%s/blocks/platform.png" % ICON_DIR)
+        self.image = registry.image(self.IMAGE, alpha=False)
         self.rect = Rect(x, y, PLATFORM_WIDTH, PLATFORM_HEIGHT)
 
 
-class Platform_1(sprite.Sprite):
-    def __init__(self, x, y):
-        sprite.Sprite.__init__(self)
-        self.image = Surface((PLATFORM_WIDTH, PLATFORM_HEIGHT))
-        self.image.fill(Color(PLATFORM_COLOR))
-        self.image = image.load("%s/blocks/platform_1.png" % ICON_DIR)
-        self.rect = Rect(x, y, PLATFORM_WIDTH, PLATFORM_HEIGHT)
+class Platform_1(Platform):
+    IMAGE = "%s/%s" % (ICON_DIR, TILES["*"])
 
 
-class Platform_2(sprite.Sprite):
-    def __init__(self, x, y):
-        sprite.Sprite.__init__(self)
-        self.image = Surface((PLATFORM_WIDTH, PLATFORM_HEIGHT))
-        self.image.fill(Color(PLATFORM_COLOR))
-        self.image = image.load("%s/blocks/platform_2.png" % ICON_DIR)
-        self.rect = Rect(x, y, PLATFORM_WIDTH, PLATFORM_HEIGHT)
+class Platform_2(Platform):
+    IMAGE = "%s/%s" % (ICON_DIR, TILES[">"])
 
 
-class Platform_3(sprite.Sprite):
-    def __init__(self, x, y):
-        sprite.Sprite.__init__(self)
-        self.image = Surface((PLATFORM_WIDTH, PLATFORM_HEIGHT))
-        self.image.fill(Color(PLATFORM_COLOR))
-        self.image = image.load("%s/blocks/platform_3.png" % ICON_DIR)
-        self.rect = Rect(x, y, PLATFORM_WIDTH, PLATFORM_HEIGHT)
+class Platform_3(Platform):
+    IMAGE = "%s/%s" % (ICON_DIR, TILES["<"])
 
 
-class Platform_4(sprite.Sprite):
-    def __init__(self, x, y):
-        sprite.Sprite.__init__(self)
-        self.image = Surface((PLATFORM_WIDTH, PLATFORM_HEIGHT))
-        self.image.fill(Color(PLATFORM_COLOR))
-        self.image = image.load("%s/blocks/platform_4.png" % ICON_DIR)
-        self.rect = Rect(x, y, PLATFORM_WIDTH, PLATFORM_HEIGHT)
\ No newline at end of file
+class Platform_4(Platform):
+    IMAGE = "%s/%s" % (ICON_DIR, TILES["^"])
+
+
+BLOCKS = {
+    "-": Platform,
+    "*": Platform_1,
+    ">": Platform_2,
+    "<": Platform_3,
+    "^": Platform_4,
+}
+
+# every image the blocks use, for preloading
+BLOCK_IMAGES = sorted(set(block.IMAGE for block in BLOCKS.values()))
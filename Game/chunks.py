@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from pygame import SRCALPHA, Surface, display, transform
+
+CHUNK_SIZE = 512
+
+
+class StaticLayer(object):
+    # Static tiles baked once into CHUNK_SIZE x CHUNK_SIZE surfaces. Drawing
+    # the level then costs one blit per chunk in view instead of one per tile.
+    def __init__(self, sprites, width, height, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.cols = (width + chunk_size - 1) // chunk_size
+        self.rows = (height + chunk_size - 1) // chunk_size
+        self.chunks = {}
+        self.scaled = {}
+        self._format = None
+        for s in sprites:
+            left = s.rect.left // chunk_size
+            right = (s.rect.right - 1) // chunk_size
+            top = s.rect.top // chunk_size
+            bottom = (s.rect.bottom - 1) // chunk_size
+            for cy in range(top, bottom + 1):
+                for cx in range(left, right + 1):
+                    chunk = self.chunks.get((cx, cy))
+                    if chunk is None:
+                        chunk = self._make_chunk()
+                        self.chunks[(cx, cy)] = chunk
+                    chunk.blit(s.image, (s.rect.x - cx * chunk_size,
+                                         s.rect.y - cy * chunk_size))
+
+    def _make_chunk(self):
+        # New surfaces start out transparent. With a display, create them in
+        # its alpha pixel format right away rather than converting a copy.
+        size = (self.chunk_size, self.chunk_size)
+        if display.get_surface() is None:
+            return Surface(size, SRCALPHA)
+        if self._format is None:
+            self._format = Surface((1, 1), SRCALPHA).convert_alpha()
+        return Surface(size, SRCALPHA, self._format)
+
+    def draw(self, surface, camera, factor=1):
+        # camera is the Camera.state rect: its topleft is the (negative)
+        # scroll offset, the viewport is the size of the target surface.
+        # factor > 1 draws at 1/factor scale, for a lower resolution frame.
+        size = self.chunk_size
+        ox, oy = camera.topleft
+        w, h = surface.get_size()
+        w, h = w * factor, h * factor
+        left = max(0, -ox // size)
+        right = min(self.cols - 1, (w - ox - 1) // size)
+        top = max(0, -oy // size)
+        bottom = min(self.rows - 1, (h - oy - 1) // size)
+        for cy in range(top, bottom + 1):
+            for cx in range(left, right + 1):
+                chunk = self.chunks.get((cx, cy))
+                if chunk is None:
+                    continue
+                if factor != 1:
+                    chunk = self._scaled((cx, cy), chunk, factor)
+                surface.blit(chunk, ((cx * size + ox) // factor, (cy * size + oy) // factor))
+
+    def _scaled(self, key, chunk, factor):
+        scaled = self.scaled.get((key, factor))
+        if scaled is None:
+            scaled = transform.scale(chunk, (self.chunk_size // factor, self.chunk_size // factor))
+            self.scaled[(key, factor)] = scaled
+        return scaled
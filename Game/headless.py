@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Runs the game simulation without a window, audio or frame cap: the SDL
+# dummy drivers are selected before pygame is initialised, nothing is
+# drawn and Player.update/Camera.update are stepped as fast as the CPU
+# allows from a scripted input source.
+
+import os
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+import argparse
+import random
+import time
+
+import levelfile
+from platformer import Camera, camera_configure, load_platforms, HERO_START, LEVEL
+from player import Player
+from tiles import PLATFORM_WIDTH, PLATFORM_HEIGHT
+from replay import Recording, ReplayError, state_hash
+
+HOLD_TICKS = 20
+KEYS = "LRU"
+
+
+def random_inputs(seed, hold=HOLD_TICKS):
+    # Endless (left, right, up) stream that changes keys every hold ticks.
+    rnd = random.Random(seed)
+    while True:
+        keys = (rnd.random() < 0.4, rnd.random() < 0.4, rnd.random() < 0.3)
+        for _ in range(hold):
+            yield keys
+
+
+def parse_script(text):
+    # One "<ticks> <keys>" pair per line, keys being any of L, R and U
+    # ("-" or nothing for no keys held), e.g. "30 RU". # starts a comment.
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].split()
+        if not line:
+            continue
+        keys = line[1].upper() if len(line) > 1 else ""
+        state = tuple(k in keys for k in KEYS)
+        for _ in range(int(line[0])):
+            yield state
+
+
+def load_script(path):
+    with open(path) as f:
+        return list(parse_script(f.read()))
+
+
+class Simulation(object):
+    def __init__(self, level=LEVEL, swept=False):
+        self.swept = swept
+        self.level = levelfile.load(level)
+        self.platforms, _ = load_platforms(self.level)
+        self.width = self.level.width * PLATFORM_WIDTH
+        self.height = self.level.height * PLATFORM_HEIGHT
+
+    def run(self, inputs, ticks, hero=None, observe=None):
+        # Plays one session and returns the hero after at most ticks steps
+        # (fewer if the input source runs out). observe(tick, hero) is
+        # called after every step, tick counting from 1.
+        if hero is None:
+            hero = Player(HERO_START[0], HERO_START[1], animate=False, swept=self.swept)
+        camera = Camera(camera_configure, self.width, self.height)
+        platforms = self.platforms
+        inputs = iter(inputs)
+        for tick in range(1, ticks + 1):
+            try:
+                left, right, up = next(inputs)
+            except StopIteration:
+                break
+            camera.update(hero)
+            platforms.update(hero.rect)
+            hero.update(left, right, up, platforms)
+            if observe is not None:
+                observe(tick, hero)
+        return hero
+
+
+def replay(recording, sim=None):
+    # Plays a recording back and checks the hero against each of its
+    # checkpoints, raising ReplayError at the first one that differs.
+    if sim is None:
+        sim = Simulation(recording.level)
+    x, y, yvel, onGround = recording.start
+    hero = Player(x, y, animate=False, swept=recording.swept)
+    hero.yvel = yvel
+    hero.onGround = onGround
+    checks = dict(zip(recording.checkpoint_ticks(), recording.checkpoints))
+
+    def observe(tick, hero):
+        expected = checks.get(tick)
+        if expected is not None and state_hash(hero) != expected:
+            raise ReplayError("diverged by tick %d of %d, hero at %s" % (
+                tick, recording.ticks, tuple(hero.rect)))
+    return sim.run(recording.inputs(), recording.ticks, hero, observe)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless, uncapped game simulation.")
+    parser.add_argument("--level", default=LEVEL)
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--ticks", type=int, default=3600, help="ticks per session (60 per second of play)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--script", help="input script to play instead of random input")
+    parser.add_argument("--replay", help="recording to play back and verify, --sessions times")
+    parser.add_argument("--swept", action="store_true", help="use swept tile collision")
+    args = parser.parse_args()
+
+    if args.replay:
+        try:
+            recording = Recording.load(args.replay)
+            sim = Simulation(recording.level)
+            hero = None
+            start = time.time()
+            for session in range(args.sessions):
+                hero = replay(recording, sim)
+        except (OSError, ReplayError) as e:
+            parser.exit(1, "%s: %s\n" % (args.replay, e))
+        elapsed = time.time() - start
+        rate = "%.0f ticks/s" % (args.sessions * recording.ticks / elapsed) if elapsed > 0 else "too fast to time"
+        print("%d replays x %d ticks in %.2fs (%s), %d checkpoints ok, hero at %s" % (
+            args.sessions, recording.ticks, elapsed, rate, len(recording.checkpoints),
+            tuple(hero.rect) if hero is not None else None))
+        return
+
+    sim = Simulation(args.level, args.swept)
+    script = load_script(args.script) if args.script else None
+    hero = None
+    start = time.time()
+    for session in range(args.sessions):
+        inputs = script if script is not None else random_inputs(args.seed + session)
+        hero = sim.run(inputs, args.ticks)
+    elapsed = time.time() - start
+    rate = "%.0f sessions/min" % (args.sessions * 60 / elapsed) if elapsed > 0 else "too fast to time"
+    print("%d sessions x %d ticks in %.2fs (%s), last hero at %s" % (
+        args.sessions, args.ticks, elapsed, rate, tuple(hero.rect) if hero is not None else None))
+
+
+if __name__ == "__main__":
+    main()
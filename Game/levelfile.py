@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import io
+import mmap
+import os
+import re
+import struct
+
+from tiles import TILES
+
+LEVEL_DIR = os.path.join(os.path.dirname(__file__), "levels")
+LEVEL_EXT = ".txt"
+CACHE_EXT = ".lvc"
+BLOCK_SIZE = 1 << 16
+
+# Compiled level: this header followed by width * height cell bytes, one
+# per cell, row-major. A cell byte is the level character itself.
+MAGIC = b"LVLC"
+VERSION = 1
+HEADER = struct.Struct("<4sHII20s")
+
+EMPTY = b" "
+SOLID = re.compile(("[%s]+" % "".join(re.escape(c) for c in TILES)).encode("ascii"))
+
+
+class LevelError(Exception):
+    pass
+
+
+class Level(object):
+    def __init__(self, width, height, cells):
+        if len(cells) != width * height:
+            raise LevelError("expected %d cells, got %d" % (width * height, len(cells)))
+        self.width = width
+        self.height = height
+        self.cells = cells
+
+    @classmethod
+    def from_rows(cls, rows):
+        width = max(len(row) for row in rows)
+        cells = b"".join(row.encode("ascii").ljust(width, EMPTY) for row in rows)
+        return cls(width, len(rows), cells)
+
+    def region(self, x, y, width, height):
+        # A sub-level covering the given cells, clipped to the level bounds.
+        width = max(0, min(width, self.width - x))
+        height = max(0, min(height, self.height - y))
+        cells = b"".join(bytes(self.cells[(y + i) * self.width + x:(y + i) * self.width + x + width])
+                         for i in range(height))
+        return Level(width, height, cells)
+
+    def row(self, y):
+        return bytes(self.cells[y * self.width:(y + 1) * self.width])
+
+    def rows(self):
+        for y in range(self.height):
+            yield self.row(y)
+
+    def runs(self, y):
+        # (start, end) column spans of consecutive solid cells in row y.
+        for m in SOLID.finditer(self.row(y)):
+            yield m.start(), m.end()
+
+    def solid_cells(self):
+        for y in range(self.height):
+            row = self.row(y)
+            for start, end in self.runs(y):
+                for x in range(start, end):
+                    yield x, y, chr(row[x])
+
+
+def level_path(name):
+    if os.path.splitext(name)[1]:
+        return name
+    return os.path.join(LEVEL_DIR, name + LEVEL_EXT)
+
+
+def _lines(f):
+    # The rows of an open level file, line endings stripped, read one line
+    # at a time so memory stays bounded by the widest row.
+    for line in f:
+        if line.endswith(b"\n"):
+            line = line[:-1]
+        if line.endswith(b"\r"):
+            line = line[:-1]
+        yield line
+
+
+def scan(path):
+    # One streaming pass over the source: its hash and the size of the grid
+    # it compiles to. Trailing blank rows don't count towards the height.
+    digest = hashlib.sha1()
+    width = height = longest = 0
+    with open(path, "rb") as f:
+        for y, row in enumerate(_lines(f)):
+            try:
+                row.decode("ascii")
+            except UnicodeDecodeError:
+                raise LevelError("row %d is not ascii" % (y + 1))
+            longest = max(longest, len(row))
+            if row.strip():
+                width, height = longest, y + 1
+        f.seek(0)
+        for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+            digest.update(block)
+    if not height:
+        raise LevelError("level is empty")
+    return digest.digest(), width, height
+
+
+def compile_level(path, out, width, height):
+    # Writes the cells of the source row by row, padded to the level width.
+    with open(path, "rb") as f:
+        for y, row in enumerate(_lines(f)):
+            if y == height:
+                break
+            out.write(row.ljust(width, EMPTY))
+
+
+def load(name):
+    # Loads a level by name (levels/<name>.txt) or path. The compiled grid
+    # is cached next to the source as <name>.lvc and mapped straight back
+    # in while the source hash still matches, so startup skips the parse.
+    # Neither path holds the whole source in memory.
+    path = level_path(name)
+    digest, width, height = scan(path)
+    cache = os.path.splitext(path)[0] + CACHE_EXT
+
+    level = _load_cache(cache, digest)
+    if level is not None:
+        return level
+
+    tmp = cache + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, width, height, digest))
+            compile_level(path, f, width, height)
+        os.replace(tmp, cache)
+    except OSError:
+        # read-only install: run from a grid compiled in memory instead
+        pass
+    else:
+        level = _load_cache(cache, digest)
+        if level is not None:
+            return level
+    out = io.BytesIO()
+    compile_level(path, out, width, height)
+    return Level(width, height, out.getvalue())
+
+
+def _load_cache(cache, digest):
+    try:
+        with open(cache, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(data) < HEADER.size:
+        data.close()
+        return None
+    magic, version, width, height, cached = HEADER.unpack_from(data)
+    if (magic, version, cached) != (MAGIC, VERSION, digest) \
+            or len(data) != HEADER.size + width * height:
+        data.close()
+        return None
+    return Level(width, height, memoryview(data)[HEADER.size:])
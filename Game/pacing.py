@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+
+from pygame import Surface, transform
+
+# Quality levels; each one keeps the degradations of the ones before it.
+FULL = 0
+NO_ANIMATION = 1 # the hero's animation frame isn't recomposed
+SKIP_RENDERS = 2 # only every RENDER_EVERY-th frame is drawn
+LOW_RES = 3 # frames are drawn at 1/LOW_RES_FACTOR size and stretched
+LEVEL_NAMES = ("full", "no animation", "skip renders", "low res")
+
+WINDOW = 0.25 # seconds of frames averaged for each decision
+MIN_FRAMES = 4
+DEGRADE_AT = 1.0 # of the budget
+RESTORE_AT = 0.8
+RENDER_EVERY = 2
+LOW_RES_FACTOR = 2
+SCALED_IMAGES = 64
+
+
+class FramePacer(object):
+    # Trades quality for speed so a slow machine keeps the simulation at
+    # full speed instead of going into slow motion. begin() and end() bracket
+    # the work of each frame, not the wait for the frame cap. Frames are
+    # averaged over windows of at least WINDOW seconds and MIN_FRAMES frames;
+    # when a window averages more than the budget the next degradation is
+    # applied. A level is undone when the average, times how much more the
+    # frames cost before it was applied, fits in RESTORE_AT of the budget,
+    # so it doesn't flip back and forth.
+    def __init__(self, budget, window=WINDOW):
+        self.budget = budget
+        self.window = window
+        self.level = FULL
+        self.changes = 0
+        self._costs = []
+        self._since = None
+        self._start = 0.0
+        self._frame = 0
+        # cost at the level just left, then how many times cheaper each
+        # degradation made the frames
+        self._left = None
+        self._savings = {}
+
+    @property
+    def animate(self):
+        return self.level < NO_ANIMATION
+
+    @property
+    def factor(self):
+        return LOW_RES_FACTOR if self.level >= LOW_RES else 1
+
+    def render(self):
+        # Whether this frame gets drawn; call once a frame.
+        self._frame += 1
+        return self.level < SKIP_RENDERS or self._frame % RENDER_EVERY == 0
+
+    def begin(self):
+        self._start = time.perf_counter()
+
+    def end(self):
+        # Returns True when the level changed.
+        now = time.perf_counter()
+        self._costs.append(now - self._start)
+        if self._since is None:
+            self._since = self._start
+        if len(self._costs) < MIN_FRAMES or now - self._since < self.window:
+            return False
+        cost = sum(self._costs) / len(self._costs)
+        self._costs = []
+        self._since = None
+        if self._left is not None:
+            self._savings[self.level - 1] = max(1.0, self._left / max(cost, 1e-6))
+            self._left = None
+        if cost > self.budget * DEGRADE_AT and self.level < LOW_RES:
+            self._left = cost
+            self._change(1)
+            return True
+        if self.level > FULL and cost * self._savings.get(self.level - 1, 1.0) < self.budget * RESTORE_AT:
+            self._change(-1)
+            return True
+        return False
+
+    def _change(self, step):
+        self.level += step
+        self.changes += 1
+
+
+class ScaledView(object):
+    # An offscreen buffer 1/factor the size of the screen to draw a frame
+    # into, stretched over the screen by present(). Sprite images are scaled
+    # once and kept, up to SCALED_IMAGES of them.
+    def __init__(self, screen, factor=LOW_RES_FACTOR):
+        self.screen = screen
+        self.factor = factor
+        w, h = screen.get_size()
+        self.buffer = Surface((w // factor, h // factor)).convert()
+        self._images = {}
+
+    def image(self, surface):
+        scaled = self._images.get(surface)
+        if scaled is None:
+            if len(self._images) >= SCALED_IMAGES:
+                self._images.clear()
+            w, h = surface.get_size()
+            scaled = transform.scale(surface, (max(1, w // self.factor), max(1, h // self.factor)))
+            self._images[surface] = scaled
+        return scaled
+
+    def present(self):
+        transform.scale(self.buffer, self.screen.get_size(), self.screen)
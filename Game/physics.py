@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# The hero's movement constants and physics step. Nothing here needs pygame:
+# a body is anything with a pygame-style rect (whose integer coordinates do
+# the rounding the step relies on), xvel, yvel, onGround and swept.
+
+MOVE_SPEED = 7
+WIDTH = 93
+HEIGHT = 128
+JUMP_POWER = 10
+GRAVITY = 0.35
+
+
+def step(body, left, right, up, platforms):
+    # One tick of movement for these keys against platforms (a TileGrid or
+    # StreamingLevel): vertical move and landing first, then horizontal.
+    if up:
+        if body.onGround:
+            body.yvel = -JUMP_POWER
+
+    if left:
+        body.xvel = -MOVE_SPEED
+
+    if right:
+        body.xvel = MOVE_SPEED
+
+    if not(left or right):
+        body.xvel = 0
+
+    if not body.onGround:
+        body.yvel += GRAVITY
+
+    body.onGround = False
+    yvel = body.yvel
+    if body.swept:
+        sweep(body, 0, yvel, platforms)
+    else:
+        body.rect.y += yvel
+    collide(body, 0, yvel, platforms)
+
+    if body.swept:
+        sweep(body, body.xvel, 0, platforms)
+    else:
+        body.rect.x += body.xvel
+    collide(body, body.xvel, 0, platforms)
+
+
+def sweep(body, xvel, yvel, platforms):
+    # Moves as far as rect += vel would, rounding included, but only up
+    # to the first tile in the way, and lands or bumps its head there.
+    rect = body.rect
+    x, y = rect.topleft
+    rect.x += xvel
+    rect.y += yvel
+    dx, dy = rect.x - x, rect.y - y
+    rect.topleft = (x, y)
+    travel = platforms.sweep(rect, dx, dy)
+    if dy:
+        rect.y += travel
+        if travel != dy:
+            body.yvel = 0
+            body.onGround = dy > 0
+    else:
+        rect.x += travel
+
+
+def collide(body, xvel, yvel, platforms):
+    rect = body.rect
+    for p in platforms.collide(rect):
+
+        if xvel > 0:
+            rect.right = p.left
+
+        if xvel < 0:
+            rect.left = p.right
+
+        if yvel > 0:
+            rect.bottom = p.top
+            body.onGround = True
+            body.yvel = 0
+
+        if yvel < 0:
+            rect.top = p.bottom
+            body.yvel = 0
@@ -2,21 +2,60 @@
 # -*- coding: utf-8 -*-
 
 
+import sys
 import pygame
+import pyganim
 from pygame import *
 from player import *
 from blocks import *
+from tilegrid import TileGrid
+import levelfile
+from chunks import StaticLayer, CHUNK_SIZE
+from streaming import StreamingLevel
+from spatial import SpatialHash
+from profiler import FrameProfiler
+from present import DirtyPresenter
+from preload import Preloader, StartupTimer
+from replay import Recorder
+from pacing import FramePacer, ScaledView, LEVEL_NAMES
 
 
 WIN_WIDTH = 1060
 WIN_HEIGHT = 720
 DISPLAY = (WIN_WIDTH, WIN_HEIGHT)
 BACKGROUND_COLOR = "#AFEEEE"
+CAPTION = "Yandex Liceum Project PyGame"
+BAKE_STATIC = True
+DIRTY_RECTS = True
+LEVEL = "level1"
+# Levels whose baked static layer (CHUNK_SIZE^2 RGBA chunks) would take more
+# than this many bytes stream chunk by chunk around the hero instead.
+STREAM_BYTES = 64 << 20
 
-pygame.init()
+# The simulation always steps at TICK_RATE; rendering runs up to MAX_FPS
+# (0 for uncapped) and draws moving sprites interpolated between ticks.
+TICK_RATE = 60
+TICK = 1.0 / TICK_RATE
+MAX_FPS = 144
+MAX_TICKS_PER_FRAME = 5
+# Stop the hero at the first tile in its way instead of fixing up overlaps
+# after moving: no fall is too fast to land, at a little more work per tick.
+SWEPT_COLLISION = False
+# When frames take longer than a tick, give up quality (see pacing.py)
+# rather than letting the simulation fall behind.
+ADAPTIVE_QUALITY = True
 
-pygame.mixer.music.load('music/C418.mp3')
-pygame.mixer.music.play(-1)
+# F3 toggles the frame timing overlay, F4 dumps the recorded frames.
+PROFILE_CSV = "frametimes.csv"
+PROFILE_TRACE = "frametrace.json"
+# F5 starts and stops recording the input, which is saved for
+# `headless.py --replay` when recording stops or the game is closed.
+RECORDING = "session.rpl"
+
+MUSIC = 'music/C418.mp3'
+# print how long each part of the startup took once the first frame is up
+STARTUP_REPORT = True
+HERO_START = (500, 1700)
 
 
 class Camera(object):
@@ -24,11 +63,31 @@ class Camera(object):
         self.camera_func = camera_func
         self.state = Rect(0, 0, width, height)
 
-    def apply(self, target):
-        return target.rect.move(self.state.topleft)
+    @property
+    def offset(self):
+        # What to add to a world position to get its screen position.
+        return self.state.topleft
+
+    def apply(self, target, alpha=1.0):
+        return interpolate(target, alpha).move(self.state.topleft)
+
+    def update(self, target, alpha=1.0):
+        self.state = self.camera_func(self.state, interpolate(target, alpha))
+
+    def viewport(self):
+        return Rect(-self.state.x, -self.state.y, WIN_WIDTH, WIN_HEIGHT)
+
+
+def interpolate(target, alpha):
+    # Where target is drawn alpha of the way from its previous tick to its
+    # current one. Sprites without a lastRect don't move between ticks.
+    rect = target.rect
+    last = getattr(target, "lastRect", None)
+    if last is None or alpha >= 1.0:
+        return rect
+    return Rect(last.x + (rect.x - last.x) * alpha, last.y + (rect.y - last.y) * alpha,
+                rect.width, rect.height)
 
-    def update(self, target):
-        self.state = self.camera_func(self.state, target.rect)
         
 def camera_configure(camera, target_rect):
     l, t, _, _ = target_rect
@@ -43,123 +102,144 @@ def camera_configure(camera, target_rect):
     return Rect(l, t, w, h)        
 
 
-def main():
-    pygame.init()
+def load_platforms(level, entities=None):
+    # Returns the collision index and the static draw layer for a level.
+    # Without an entities group nothing will be drawn, so no tile sprites
+    # are built and the layer is None.
+    width = level.width * PLATFORM_WIDTH
+    height = level.height * PLATFORM_HEIGHT
+    chunks = -(-width // CHUNK_SIZE) * -(-height // CHUNK_SIZE)
+    if chunks * CHUNK_SIZE * CHUNK_SIZE * 4 > STREAM_BYTES:
+        platforms = StreamingLevel(level, images=entities is not None)
+        return platforms, (platforms if entities is not None else None)
+
+    platforms = TileGrid(level)
+    if entities is None:
+        return platforms, None
+    static = []
+    for x, y, col in level.solid_cells():
+        pf = BLOCKS[col](x * PLATFORM_WIDTH, y * PLATFORM_HEIGHT)
+        if BAKE_STATIC:
+            static.append(pf)
+        else:
+            entities.add(pf)
+    return platforms, StaticLayer(static, width, height)
+
+
+def draw(screen, bg, camera, layer, sprites, alpha=1.0, area=None):
+    # Draws the frame; with area (screen coordinates) only that part of the
+    # screen is touched.
+    view = camera.viewport()
+    if area is not None:
+        screen.set_clip(area)
+        view = area.move(view.topleft)
+    screen.blit(bg, (0, 0))
+    layer.draw(screen, camera.state)
+    # one blits() call for every visible sprite, offset applied inline;
+    # only the dynamic ones need interpolating between ticks
+    ox, oy = camera.offset
+    dynamic = sprites.dynamic
+    if alpha >= 1.0 or not dynamic:
+        batch = [(e.image, (e.rect.x + ox, e.rect.y + oy)) for e in sprites.query(view)]
+    else:
+        batch = [(e.image, interpolate(e, alpha).move(ox, oy) if e in dynamic
+                  else (e.rect.x + ox, e.rect.y + oy)) for e in sprites.query(view)]
+    screen.blits(batch, doreturn=False)
+    if area is not None:
+        screen.set_clip(None)
+
+
+def draw_scaled(view, color, camera, layer, sprites, alpha=1.0):
+    # The whole frame at 1/view.factor resolution, stretched over the screen.
+    factor = view.factor
+    view.buffer.fill(color)
+    layer.draw(view.buffer, camera.state, factor)
+    ox, oy = camera.offset
+    dynamic = sprites.dynamic
+    batch = []
+    for e in sprites.query(camera.viewport()):
+        rect = interpolate(e, alpha) if e in dynamic else e.rect
+        batch.append((view.image(e.image), ((rect.x + ox) // factor, (rect.y + oy) // factor)))
+    view.buffer.blits(batch, doreturn=False)
+    view.present()
+
+
+def load_music(path):
+    # The mixer is only started once there is music to play; this runs on a
+    # preloader thread, so opening the audio device doesn't delay the window.
+    if not pygame.mixer.get_init():
+        pygame.mixer.init()
+    pygame.mixer.music.load(path)
+
+
+def main(level=LEVEL):
+    # Only the SDL subsystems the game uses are started, when it needs
+    # them: the display here, the mixer in load_music and fonts by the
+    # profiler overlay.
+    startup = StartupTimer()
+    pygame.display.init()
     screen = pygame.display.set_mode(DISPLAY)
-    pygame.display.set_caption("Yandex Liceum Project PyGame")
+    pygame.display.set_caption(CAPTION)
+    startup.mark("display")
+
+    # decode everything on worker threads behind a loading bar
+    preload = Preloader()
+    preload.images(PLAYER_IMAGES)
+    preload.images(BLOCK_IMAGES, alpha=False)
+    # the music starts once it's loaded, it doesn't hold up the first frame
+    preload.add("music", load_music, MUSIC, background=True,
+                finish=lambda _: pygame.mixer.music.play(-1))
+    preload.add("level", levelfile.load, level)
+    level_name = level
+    level = preload.run(screen, BACKGROUND_COLOR)["level"]
+    startup.mark("preload")
+    startup.add("preload work", preload.busy)
     bg = Surface((WIN_WIDTH,WIN_HEIGHT))
 
     bg.fill(Color(BACKGROUND_COLOR))
     
-    hero = Player(500, 1700)
+    clock = pyganim.FrameClock()
+    hero = Player(HERO_START[0], HERO_START[1], clock=clock, swept=SWEPT_COLLISION)
     left = right = False
     up = False
     
     entities = pygame.sprite.Group()
-    platforms = []
     
     entities.add(hero)
-           
-    level = [
-       "^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^",
-       ">                                <",
-       ">                                <",
-       ">                                <",
-       ">                                <",
-       ">                                <",
-       ">                                <",
-       ">                                <",
-       ">            --------            <",
-       ">                                <",
-       ">---                             <",
-       ">                              --<",
-       ">                                <",
-       ">                                <",
-       ">                    ---         <",
-       ">       --                       <",
-       ">                                <",
-       ">                                <",
-       ">--              --              <",
-       ">                                <",
-       ">                             -- <",
-       ">                                <",
-       ">                                <",
-       ">   ----                         <",
-       ">                                <",
-       ">           --                   <",
-       ">                                <",
-       ">                                <",
-       ">                                <",
-       ">                      ---       <",
-       ">                                <",
-       ">                                <",
-       ">                                <",
-       ">                                <",
-       ">            --------            <",
-       ">                                <",
-       ">---                             <",
-       ">                              --<",
-       ">                                <",
-       ">                                <",
-       ">                    ---         <",
-       ">       --                       <",
-       ">                                <",
-       ">                                <",
-       ">--              --              <",
-       ">                                <",
-       ">                                <",
-       ">                                <",
-       ">                                <",
-       ">   ----                         <",
-       ">                                <",
-       ">           --                   <",
-       ">                                <",
-       ">                      ---       <",
-       ">                                <",
-       ">                                <",
-       ">                                <",
-       ">                                <",
-       ">--------------------------------<",
-       "**********************************"]
-       
+    startup.mark("player")
+
     timer = pygame.time.Clock()
-    x = y = 0
-    for row in level:
-        for col in row:
-            if col == "-":
-                pf = Platform(x, y)
-                entities.add(pf)
-                platforms.append(pf)
-            if col == "*":
-                pf = Platform_1(x, y)
-                entities.add(pf)
-                platforms.append(pf)
-            if col == ">":
-                pf = Platform_2(x, y)
-                entities.add(pf)
-                platforms.append(pf)
-            if col == "<":
-                pf = Platform_3(x, y)
-                entities.add(pf)
-                platforms.append(pf)
-            if col == "^":
-                pf = Platform_4(x, y)
-                entities.add(pf)
-                platforms.append(pf)
-
-            x += PLATFORM_WIDTH
-        y += PLATFORM_HEIGHT
-        x = 0
-    
-    total_level_width  = len(level[0])*PLATFORM_WIDTH
-    total_level_height = len(level)*PLATFORM_HEIGHT
+    total_level_width  = level.width*PLATFORM_WIDTH
+    total_level_height = level.height*PLATFORM_HEIGHT
     
     camera = Camera(camera_configure, total_level_width, total_level_height) 
+    platforms, layer = load_platforms(level, entities)
+    sprites = SpatialHash()
+    for e in entities:
+        sprites.add(e, dynamic=e is hero)
+    startup.mark("level")
+    status = None
+    accumulator = 0.0
+    profiler = FrameProfiler()
+    pacer = FramePacer(TICK)
+    view = None
+    alpha = 1.0
+
+    def repaint(area):
+        draw(screen, bg, camera, layer, sprites, alpha, area)
+    presenter = DirtyPresenter(screen, repaint)
+    recorder = None
     
     while 1:
-        timer.tick(60)
+        accumulator += timer.tick(MAX_FPS) / 1000.0
+        clock.tick()
+        preload.poll()
+        profiler.begin()
+        pacer.begin()
         for e in pygame.event.get():
             if e.type == QUIT:
+                if recorder is not None:
+                    recorder.finish().save(RECORDING)
                 raise SystemExit == QUIT
             if e.type == KEYDOWN and e.key == K_UP:
                 up = True
@@ -176,17 +256,81 @@ def main():
             if e.type == KEYUP and e.key == K_LEFT:
                 left = False
 
-        screen.blit(bg, (0, 0))
+            if e.type == KEYDOWN and e.key == K_F3:
+                profiler.toggle()
+                presenter.invalidate()
+            if e.type == KEYDOWN and e.key == K_F4:
+                profiler.dump_csv(PROFILE_CSV)
+                profiler.dump_trace(PROFILE_TRACE)
+            if e.type == KEYDOWN and e.key == K_F5:
+                if recorder is None:
+                    recorder = Recorder(level_name, hero, TICK_RATE)
+                else:
+                    recorder.finish().save(RECORDING)
+                    recorder = None
+        profiler.mark("events")
 
+        ticks = 0
+        while accumulator >= TICK:
+            if ticks == MAX_TICKS_PER_FRAME:
+                # too far behind to catch up: drop the backlog rather than
+                # spiral, the game slows down instead of freezing
+                accumulator = 0.0
+                break
+            platforms.update(hero.rect)
+            hero.update(left, right, up,platforms)
+            if recorder is not None:
+                recorder.tick(left, right, up, hero)
+            sprites.move(hero)
+            accumulator -= TICK
+            ticks += 1
+        profiler.mark("update")
 
-        camera.update(hero)
-        hero.update(left, right, up,platforms)
-        for e in entities:
-            screen.blit(e.image, camera.apply(e))
+        alpha = accumulator / TICK
+        camera.update(hero, alpha)
+        profiler.mark("camera")
+        # under load not every frame is drawn; the ticks above still ran, so
+        # the game doesn't slow down
+        if pacer.render():
+            sprites.cull(camera.viewport())
+            if pacer.factor > 1:
+                if view is None or view.factor != pacer.factor:
+                    view = ScaledView(screen, pacer.factor)
+                draw_scaled(view, Color(BACKGROUND_COLOR), camera, layer, sprites, alpha)
+                # the screen holds a stretched frame now, not one to patch up
+                presenter.invalidate()
+                dirty = None
+            elif DIRTY_RECTS:
+                moving = [Rect(camera.apply(hero, alpha).topleft, hero.image.get_size())]
+                dirty = presenter.redraw(camera.state.topleft, moving, full=profiler.overlay)
+            else:
+                draw(screen, bg, camera, layer, sprites, alpha)
+                dirty = None
+            profiler.draw(screen)
+            profiler.mark("draw")
+            if (sprites.culled, pacer.level) != status:
+                status = (sprites.culled, pacer.level)
+                if pacer.level:
+                    pygame.display.set_caption("%s (culled: %d, %s)" % (
+                        CAPTION, sprites.culled, LEVEL_NAMES[pacer.level]))
+                else:
+                    pygame.display.set_caption("%s (culled: %d)" % (CAPTION, sprites.culled))
         
         
-        pygame.display.update()
+            if dirty is None:
+                pygame.display.update()
+            else:
+                pygame.display.update(dirty)
+            if startup is not None:
+                startup.mark("first frame")
+                if STARTUP_REPORT:
+                    print(startup.report())
+                startup = None
+            profiler.mark("present")
+        profiler.end()
+        if ADAPTIVE_QUALITY and pacer.end():
+            hero.animate = pacer.animate
         
 
 if __name__ == "__main__":
-    main()
+    main(*sys.argv[1:2])
@@ -1,16 +1,14 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from pygame import *
+from pygame import Color, Rect, Surface, sprite
+from assets import registry
+from physics import WIDTH, HEIGHT
+import physics
 import pyganim
 import os
 
-MOVE_SPEED = 7
-WIDTH = 93
-HEIGHT = 128
 COLOR =  "#888888"
-JUMP_POWER = 10
-GRAVITY = 0.35
 ANIMATION_DELAY = 0.1
 ICON_DIR = os.path.dirname(__file__)
 
@@ -28,10 +26,25 @@ ANIMATION_JUMP_LEFT = [('%s/player/jl.png' % ICON_DIR, 0.1)]
 ANIMATION_JUMP_RIGHT = [('%s/player/jr.png' % ICON_DIR, 0.1)]
 ANIMATION_JUMP = [('%s/player/j.png' % ICON_DIR, 0.1)]
 ANIMATION_STAY = [('%s/player/0.png' % ICON_DIR, 0.1)]
+# every image the animations use, for preloading
+PLAYER_IMAGES = ANIMATION_RIGHT + ANIMATION_LEFT + [name for name, _ in
+    ANIMATION_JUMP_LEFT + ANIMATION_JUMP_RIGHT + ANIMATION_JUMP + ANIMATION_STAY]
+
+
+def load_frames(frames):
+    return [(registry.image(anim), delay) for anim, delay in frames]
+
 
 class Player(sprite.Sprite):
-    def __init__(self, x, y):
+    def __init__(self, x, y, animate=True, clock=None, swept=False):
         sprite.Sprite.__init__(self)
+        # animate=False skips loading and compositing the animations, for
+        # simulations that never draw the player. clock is handed to every
+        # animation (see pyganim.FrameClock). swept=True stops each move at
+        # the first tile in the way instead of moving and then fixing up the
+        # overlap, so no speed is fast enough to pass through a tile.
+        self.animate = animate
+        self.swept = swept
         self.xvel = 0
         self.startX = x
         self.startY = y
@@ -40,91 +53,66 @@ class Player(sprite.Sprite):
         self.image = Surface((WIDTH,HEIGHT))
         self.image.fill(Color(COLOR))
         self.rect = Rect(x, y, WIDTH, HEIGHT)
+        self.lastRect = self.rect.copy()
         self.image.set_colorkey(Color(COLOR))
+        if not animate:
+            return
 
         boltAnim = []
         for anim in ANIMATION_RIGHT:
-            boltAnim.append((anim, ANIMATION_DELAY))
-        self.boltAnimRight = pyganim.PygAnimation(boltAnim)
+            boltAnim.append((registry.image(anim), ANIMATION_DELAY))
+        self.boltAnimRight = pyganim.PygAnimation(boltAnim, clock=clock)
         self.boltAnimRight.play()
 
         boltAnim = []
         for anim in ANIMATION_LEFT:
-            boltAnim.append((anim, ANIMATION_DELAY))
-        self.boltAnimLeft = pyganim.PygAnimation(boltAnim)
+            boltAnim.append((registry.image(anim), ANIMATION_DELAY))
+        self.boltAnimLeft = pyganim.PygAnimation(boltAnim, clock=clock)
         self.boltAnimLeft.play()
         
-        self.boltAnimStay = pyganim.PygAnimation(ANIMATION_STAY)
+        self.boltAnimStay = pyganim.PygAnimation(load_frames(ANIMATION_STAY), clock=clock)
         self.boltAnimStay.play()
-        self.boltAnimStay.blit(self.image, (0, 0))
         
-        self.boltAnimJumpLeft= pyganim.PygAnimation(ANIMATION_JUMP_LEFT)
+        self.boltAnimJumpLeft= pyganim.PygAnimation(load_frames(ANIMATION_JUMP_LEFT), clock=clock)
         self.boltAnimJumpLeft.play()
         
-        self.boltAnimJumpRight= pyganim.PygAnimation(ANIMATION_JUMP_RIGHT)
+        self.boltAnimJumpRight= pyganim.PygAnimation(load_frames(ANIMATION_JUMP_RIGHT), clock=clock)
         self.boltAnimJumpRight.play()
         
-        self.boltAnimJump= pyganim.PygAnimation(ANIMATION_JUMP)
+        self.boltAnimJump= pyganim.PygAnimation(load_frames(ANIMATION_JUMP), clock=clock)
         self.boltAnimJump.play()
+
+        self.shownAnim = None
+        self.shownFrame = None
+        self.compose(False, False, False)
         
 
     def update(self, left, right, up, platforms):
-        
-        if up:
-            if self.onGround:
-                self.yvel = -JUMP_POWER
-            self.image.fill(Color(COLOR))
-            self.boltAnimJump.blit(self.image, (0, 0))
-               
-                       
-        if left:
-            self.xvel = -MOVE_SPEED
-            self.image.fill(Color(COLOR))
-            if up:
-                self.boltAnimJumpLeft.blit(self.image, (0, 0))
-            else:
-                self.boltAnimLeft.blit(self.image, (0, 0))
- 
+        self.lastRect.topleft = self.rect.topleft
+        if self.animate:
+            self.compose(left, right, up)
+        physics.step(self, left, right, up, platforms)
+   
+    def compose(self, left, right, up):
+        # Shows the current frame of the animation for these keys by pointing
+        # self.image at the frame Surface itself. Nothing is copied, and
+        # nothing at all happens while the animation and frame stay the same.
         if right:
-            self.xvel = MOVE_SPEED
-            self.image.fill(Color(COLOR))
-            if up:
-                self.boltAnimJumpRight.blit(self.image, (0, 0))
-            else:
-                self.boltAnimRight.blit(self.image, (0, 0))
-         
-        if not(left or right):
-            self.xvel = 0
-            if not up:
-                self.image.fill(Color(COLOR))
-                self.boltAnimStay.blit(self.image, (0, 0))
-            
-        if not self.onGround:
-            self.yvel +=  GRAVITY
-            
-        self.onGround = False;
-        self.rect.y += self.yvel
-        self.collide(0, self.yvel, platforms)
-
-        self.rect.x += self.xvel
-        self.collide(self.xvel, 0, platforms)
+            anim = self.boltAnimJumpRight if up else self.boltAnimRight
+        elif left:
+            anim = self.boltAnimJumpLeft if up else self.boltAnimLeft
+        elif up:
+            anim = self.boltAnimJump
+        else:
+            anim = self.boltAnimStay
+        frame = anim.currentFrameNum
+        if anim is not self.shownAnim or frame != self.shownFrame:
+            self.shownAnim = anim
+            self.shownFrame = frame
+            self.image = anim.getFrame(frame)
    
-    def collide(self, xvel, yvel, platforms):
-        for p in platforms:
-            if sprite.collide_rect(self, p):
-
-                if xvel > 0:
-                    self.rect.right = p.rect.left
+    def sweep(self, xvel, yvel, platforms):
+        physics.sweep(self, xvel, yvel, platforms)
 
-                if xvel < 0:
-                    self.rect.left = p.rect.right
-
-                if yvel > 0:
-                    self.rect.bottom = p.rect.top
-                    self.onGround = True
-                    self.yvel = 0
-
-                if yvel < 0:
-                    self.rect.top = p.rect.bottom
-                    self.yvel = 0
-       
+    def collide(self, xvel, yvel, platforms):
+        physics.collide(self, xvel, yvel, platforms)
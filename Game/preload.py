@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pygame
+from assets import registry
+
+LOADING_FPS = 30
+BAR_SIZE = (400, 16)
+BAR_COLOR = (60, 60, 60)
+
+
+class Preloader(object):
+    # Runs loading tasks on a thread pool while the main thread keeps the
+    # window responsive and draws a progress bar. pygame lets go of the GIL
+    # while it decodes images and reads files, so the tasks really overlap.
+    # Anything that needs the display (converting surfaces, blitting) stays on
+    # the main thread: finish callbacks run there as each task completes.
+    # Tasks added with background=True don't hold up run(); poll() finishes them
+    # from the game loop once they are done. Those are optional: if one fails
+    # poll() reports it and records the exception in errors instead of raising.
+    def __init__(self, jobs=None):
+        self.jobs = jobs or min(8, (os.cpu_count() or 1) + 2)
+        self._tasks = []
+        self._futures = {}
+        self._background = set()
+        self.results = {}
+        # exceptions of the background tasks that failed, by name
+        self.errors = {}
+        # seconds each task spent in its worker, by name
+        self.timings = {}
+
+    def add(self, name, func, *args, finish=None, background=False):
+        self._tasks.append((name, func, args, finish, background))
+
+    def images(self, paths, alpha=True):
+        for path in paths:
+            self.add(path, registry.decode, path,
+                     finish=lambda surf, path=path: registry.store(path, surf, alpha))
+
+    def _timed(self, name, func, args):
+        start = time.perf_counter()
+        result = func(*args)
+        self.timings[name] = time.perf_counter() - start
+        return result
+
+    def _finish(self, future):
+        # A task that raised re-raises here.
+        name, finish = self._futures.pop(future)
+        self.results[name] = future.result()
+        if finish is not None:
+            finish(self.results[name])
+
+    @property
+    def busy(self):
+        # total worker time; more than the wall time when tasks overlapped
+        return sum(self.timings.values())
+
+    def run(self, screen=None, color=None):
+        # Starts every task added so far and waits for the ones that aren't
+        # background tasks. Returns the results by name.
+        tasks, self._tasks = self._tasks, []
+        pool = ThreadPoolExecutor(self.jobs)
+        pending = set()
+        for name, func, args, finish, background in tasks:
+            future = pool.submit(self._timed, name, func, args)
+            self._futures[future] = (name, finish)
+            (self._background if background else pending).add(future)
+        # the workers still finish everything that was submitted
+        pool.shutdown(wait=False)
+        total = len(pending)
+        shown = None
+        while pending:
+            now = time.perf_counter()
+            if screen is not None and (shown is None or now - shown >= 1.0 / LOADING_FPS):
+                self.draw(screen, total - len(pending), total, color)
+                shown = now
+            done, pending = wait(pending, 1.0 / LOADING_FPS, FIRST_COMPLETED)
+            for future in done:
+                self._finish(future)
+        return self.results
+
+    def poll(self):
+        # Finishes the background tasks that are done; call once a frame.
+        if self._background:
+            for future in [f for f in self._background if f.done()]:
+                self._background.discard(future)
+                name = self._futures[future][0]
+                try:
+                    self._finish(future)
+                except Exception as e:
+                    self.errors[name] = e
+                    print("preload: %s failed: %s" % (name, e), file=sys.stderr)
+
+    def draw(self, screen, done, total, color=None):
+        for e in pygame.event.get(pygame.QUIT):
+            raise SystemExit
+        screen.fill(pygame.Color(color) if color is not None else (0, 0, 0))
+        bar = pygame.Rect((0, 0), BAR_SIZE)
+        bar.center = screen.get_rect().center
+        pygame.draw.rect(screen, BAR_COLOR, bar, 1)
+        fill = bar.inflate(-4, -4)
+        fill.width = fill.width * done // max(1, total)
+        screen.fill(BAR_COLOR, fill)
+        pygame.display.flip()
+
+
+class StartupTimer(object):
+    # Wall time between named points of the startup, reported once the first
+    # frame is on screen.
+    def __init__(self):
+        self.start = self._last = time.perf_counter()
+        self.phases = []
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def add(self, name, seconds):
+        # a figure measured elsewhere; doesn't move the mark
+        self.phases.append((name, seconds))
+
+    def report(self):
+        return "startup %.1f ms: %s" % ((self._last - self.start) * 1000.0, ", ".join(
+            "%s %.1f" % (name, seconds * 1000.0) for name, seconds in self.phases))
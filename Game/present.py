@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from pygame import Rect
+
+
+class DirtyPresenter(object):
+    # Redraws only what changed since the last frame. The screen surface
+    # keeps the previous frame, so:
+    #   - camera still: repaint the old and new rects of the moving sprites
+    #     and push just those to the display;
+    #   - camera scrolled: shift the old frame with Surface.scroll, repaint
+    #     the strips it exposed plus the moving sprites, and push the whole
+    #     screen (every pixel changed, but few were drawn).
+    # repaint(area) must draw the complete frame clipped to area.
+    def __init__(self, screen, repaint):
+        self.screen = screen
+        self.repaint = repaint
+        self.offset = None
+        self.moving = []
+
+    def invalidate(self):
+        self.offset = None
+
+    def redraw(self, offset, moving, full=False):
+        # offset is the camera scroll (Camera.state.topleft), moving the
+        # screen rects of the sprites that move or animate. Returns the
+        # rects to pass to display.update, or None for the whole screen.
+        screen_rect = self.screen.get_rect()
+        last, self.moving = self.moving, moving
+        if full or self.offset is None:
+            self.offset = offset
+            self.repaint(screen_rect)
+            return None
+
+        dx = offset[0] - self.offset[0]
+        dy = offset[1] - self.offset[1]
+        self.offset = offset
+        w, h = screen_rect.size
+        if abs(dx) >= w or abs(dy) >= h:
+            self.repaint(screen_rect)
+            return None
+
+        dirty = []
+        if dx or dy:
+            self.screen.scroll(dx, dy)
+            if dx > 0:
+                dirty.append(Rect(0, 0, dx, h))
+            elif dx < 0:
+                dirty.append(Rect(w + dx, 0, -dx, h))
+            if dy > 0:
+                dirty.append(Rect(0, 0, w, dy))
+            elif dy < 0:
+                dirty.append(Rect(0, h + dy, w, -dy))
+            last = [r.move(dx, dy) for r in last]
+        for i, rect in enumerate(moving):
+            if i < len(last) and rect.colliderect(last[i]):
+                dirty.append(rect.union(last[i]))
+            else:
+                dirty.append(rect)
+                if i < len(last):
+                    dirty.append(last[i])
+        dirty.extend(last[len(moving):])
+        dirty = [r.clip(screen_rect) for r in dirty]
+        dirty = [r for r in dirty if r.width and r.height]
+        for rect in dirty:
+            self.repaint(rect)
+        if dx or dy:
+            return None
+        return dirty
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import csv
+import json
+import time
+from array import array
+
+import pygame
+
+PHASES = ("events", "update", "camera", "draw", "present")
+HISTORY = 600
+OVERLAY_REFRESH = 30
+OVERLAY_COLOR = (20, 20, 20)
+OVERLAY_BACKGROUND = (255, 255, 255, 190)
+
+
+def percentile(values, p):
+    # values must be sorted
+    if not values:
+        return 0.0
+    i = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[i]
+
+
+class FrameProfiler(object):
+    # Per-phase frame timings kept in fixed-size ring buffers. The loop calls
+    # begin() at the top of a frame and mark(phase) as each phase ends; with
+    # the profiler disabled each call is a single attribute check.
+    def __init__(self, phases=PHASES, size=HISTORY):
+        self.phases = phases
+        self.size = size
+        self.enabled = False
+        self.overlay = False
+        self.starts = array("d", [0.0] * size)
+        self.totals = array("d", [0.0] * size)
+        self.times = dict((phase, array("d", [0.0] * size)) for phase in phases)
+        self.index = 0
+        self.count = 0
+        self._start = self._last = 0.0
+        self._font = None
+        self._text = None
+        self._frames = 0
+
+    def toggle(self):
+        self.enabled = self.overlay = not self.enabled
+        if self.enabled:
+            # toggled mid-frame: start timing from here
+            self.begin()
+
+    def begin(self):
+        if not self.enabled:
+            return
+        self._start = self._last = time.perf_counter()
+        for phase in self.phases:
+            self.times[phase][self.index] = 0.0
+
+    def mark(self, phase):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.times[phase][self.index] += now - self._last
+        self._last = now
+
+    def end(self):
+        if not self.enabled:
+            return
+        i = self.index
+        self.starts[i] = self._start
+        self.totals[i] = self._last - self._start
+        self.index = (i + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def _order(self):
+        # ring indices from oldest to newest
+        first = (self.index - self.count) % self.size
+        return [(first + n) % self.size for n in range(self.count)]
+
+    def stats(self):
+        order = self._order()
+        result = {}
+        for name, values in [("frame", self.totals)] + [(p, self.times[p]) for p in self.phases]:
+            ordered = sorted(values[i] for i in order)
+            result[name] = dict(("p%d" % p, percentile(ordered, p) * 1000.0) for p in (50, 95, 99))
+        return result
+
+    def draw(self, surface):
+        if not self.overlay or not self.count:
+            return
+        self._frames += 1
+        if self._text is None or self._frames >= OVERLAY_REFRESH:
+            self._frames = 0
+            if self._font is None:
+                if not pygame.font.get_init():
+                    pygame.font.init()
+                self._font = pygame.font.SysFont(None, 20)
+            stats = self.stats()
+            lines = ["%-8s p50 %6.2f  p95 %6.2f  p99 %6.2f ms" % (
+                name, stats[name]["p50"], stats[name]["p95"], stats[name]["p99"])
+                for name in ("frame",) + tuple(self.phases)]
+            rendered = [self._font.render(line, True, OVERLAY_COLOR) for line in lines]
+            width = max(r.get_width() for r in rendered) + 8
+            height = sum(r.get_height() for r in rendered) + 8
+            self._text = pygame.Surface((width, height), pygame.SRCALPHA)
+            self._text.fill(OVERLAY_BACKGROUND)
+            y = 4
+            for r in rendered:
+                self._text.blit(r, (4, y))
+                y += r.get_height()
+        surface.blit(self._text, (8, 8))
+
+    def dump_csv(self, path):
+        with open(path, "w") as f:
+            writer = csv.writer(f)
+            writer.writerow(("start", "frame") + tuple(self.phases))
+            for i in self._order():
+                writer.writerow(["%.6f" % self.starts[i], "%.6f" % self.totals[i]] +
+                                ["%.6f" % self.times[p][i] for p in self.phases])
+
+    def dump_trace(self, path):
+        # Chrome trace-event format (chrome://tracing, Perfetto). Phases are
+        # laid out back to back inside each frame.
+        events = []
+        for i in self._order():
+            ts = self.starts[i] * 1e6
+            events.append({"name": "frame", "ph": "X", "ts": ts, "dur": self.totals[i] * 1e6,
+                           "pid": 1, "tid": 1})
+            for phase in self.phases:
+                dur = self.times[phase][i] * 1e6
+                events.append({"name": phase, "ph": "X", "ts": ts, "dur": dur, "pid": 1, "tid": 1})
+                ts += dur
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
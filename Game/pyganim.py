@@ -13,9 +13,10 @@
 #
 
 
-# TODO: Feature idea: if the same image file is specified, re-use the Surface object. (Make this optional though.)
-
-import pygame, time
+import time, os, itertools
+from collections import OrderedDict
+# pygame itself is imported inside the functions that use it, so importing
+# this module costs nothing until an animation is actually built.
 
 # setting up constants
 PLAYING = 'playing'
@@ -33,20 +34,214 @@ SOUTHWEST = 'southwest'
 SOUTH = 'south'
 SOUTHEAST = 'southeast'
 
+# How many image files nothing references any more are kept loaded by the
+# shared surface cache before the least recently used ones are dropped.
+CACHE_SIZE = 64
+
+# Bytes of transformed frames memoized for all animations together (see
+# TransformCache).
+TRANSFORM_BUDGET = 8 * 1024 * 1024
+
+
+class SurfaceCache(object):
+    # Process-wide cache of the Surfaces loaded from image files. Every
+    # PygAnimation built from filenames gets its frames from here, so the
+    # same file is only read and decoded once no matter how many animations
+    # use it. Entries are reference counted; once an entry is no longer
+    # referenced it is kept on an LRU list of at most maxUnused entries.
+    def __init__(self, maxUnused=CACHE_SIZE):
+        self.maxUnused = maxUnused
+        self._surfaces = {}
+        self._refcounts = {}
+        self._unused = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, filename):
+        return os.path.normcase(os.path.abspath(filename))
+
+    def acquire(self, filename):
+        # Returns the Surface for filename and takes a reference to it.
+        import pygame
+        key = self._key(filename)
+        surf = self._surfaces.get(key)
+        if surf is None:
+            self.misses += 1
+            surf = pygame.image.load(filename)
+            self._surfaces[key] = surf
+            self._refcounts[key] = 0
+        else:
+            self.hits += 1
+            self._unused.pop(key, None)
+        self._refcounts[key] += 1
+        return key, surf
+
+    def release(self, key):
+        if key not in self._refcounts:
+            return
+        self._refcounts[key] -= 1
+        if self._refcounts[key] > 0:
+            return
+        self._unused[key] = True
+        while len(self._unused) > self.maxUnused:
+            oldKey, _ = self._unused.popitem(last=False)
+            del self._surfaces[oldKey]
+            del self._refcounts[oldKey]
+
+    def clear(self):
+        # Drops every unreferenced Surface.
+        for key in list(self._unused):
+            del self._surfaces[key]
+            del self._refcounts[key]
+        self._unused.clear()
+
+    def __len__(self):
+        return len(self._surfaces)
+
+
+surfaceCache = SurfaceCache()
+
+
+class TransformCache(object):
+    # Process-wide memo of transformed frames, shared by every PygAnimation
+    # and kept under one budget in bytes. Each set of frames an animation can
+    # show is a state, a number from one counter for the whole module: an
+    # animation's untransformed frames are its base state and a transform
+    # leads from one state to another. Entries are kept LRU first, and the
+    # transition to a state is forgotten along with its frames.
+    def __init__(self, budget=TRANSFORM_BUDGET):
+        self.budget = budget
+        self.size = 0
+        self._entries = OrderedDict() # state -> (frames, bytes, parent state, op)
+        self._transitions = {} # (parent state, op) -> state
+        self._states = itertools.count(1)
+        self.hits = 0
+        self.misses = 0
+
+    def newState(self):
+        return next(self._states)
+
+    def lookup(self, state, op):
+        # Returns the state op leads to from state, if its frames are kept.
+        target = self._transitions.get((state, op))
+        if target is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return target
+
+    def get(self, state):
+        # Returns (frames, bytes, parent state, op) or None.
+        entry = self._entries.pop(state, None)
+        if entry is not None:
+            self._entries[state] = entry # most recently used
+        return entry
+
+    def put(self, state, frames, parent=None, op=None):
+        size = sum(surf.get_width() * surf.get_height() * surf.get_bytesize() for surf in frames)
+        if size > self.budget:
+            return
+        self._drop(state)
+        self._entries[state] = (frames, size, parent, op)
+        if parent is not None:
+            self._transitions[(parent, op)] = state
+        self.size += size
+        while self.size > self.budget:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, state):
+        entry = self._entries.pop(state, None)
+        if entry is None:
+            return
+        _, size, parent, op = entry
+        self.size -= size
+        if self._transitions.get((parent, op)) == state:
+            del self._transitions[(parent, op)]
+
+    def clear(self):
+        self._entries.clear()
+        self._transitions.clear()
+        self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+transformCache = TransformCache()
+
+
+class FrameClock(object):
+    # A clock that only moves when tick() is called. Give the same
+    # FrameClock to every animation and tick it once per frame: they all see
+    # one timestamp and reading the time costs no clock syscall.
+    def __init__(self, source=time.time):
+        self._source = source
+        self.now = source()
+
+    def tick(self, now=None):
+        # Samples the source clock, or jumps to now if it is given.
+        if now is None:
+            now = self._source()
+        self.now = now
+        return now
+
+    def __call__(self):
+        return self.now
+
+
+class TickClock(FrameClock):
+    # A simulated clock: every tick() advances it by exactly step seconds,
+    # so animations replay identically however fast the loop runs.
+    def __init__(self, step=1.0 / 60, start=0.0):
+        self.step = step
+        self.ticks = 0
+        self.start = start
+        self.now = start
+
+    def tick(self, now=None):
+        if now is None:
+            self.ticks += 1
+            now = self.start + self.ticks * self.step
+        self.now = now
+        return now
+
+
+# Clock used by animations and conductors created without one. Any
+# callable returning seconds works.
+_defaultClock = time.time
+
+
+def setDefaultClock(clock):
+    global _defaultClock
+    _defaultClock = clock if clock is not None else time.time
+
+
+def getDefaultClock():
+    return _defaultClock
+
 
 class PygAnimation(object):
-    def __init__(self, frames, loop=True):
+    def __init__(self, frames, loop=True, cache=True, clock=None):
         # Constructor function for the animation object. Starts off in the STOPPED state.
         #
         # @param frames
         #     A list of tuples for each frame of animation, in one of the following format:
         #       (image_of_frame<pygame.Surface>, duration_in_seconds<int>)
         #       (filename_of_image<str>, duration_in_seconds<int>)
+        #       ((sheet<pygame.Surface or str>, rect), duration_in_seconds<int>)
+        #     The last form uses the rect region of a sprite sheet as a
+        #     subsurface, so frames share the sheet's pixels instead of being
+        #     copied (see sheetFrames()). Each sheet file is loaded once.
         #     Note that the images and duration cannot be changed. A new PygAnimation object
         #     will have to be created.
         # @param loop Tells the animation object to keep playing in a loop.
+        # @param cache Share the Surfaces of frames given as filenames through
+        #     surfaceCache instead of loading a private copy.
+        # @param clock Callable returning the current time in seconds, e.g. a
+        #     FrameClock. Defaults to getDefaultClock().
 
         # _images stores the pygame.Surface objects of each frame
+        import pygame
         self._images = []
         # _durations stores the durations (in seconds) of each frame.
         # e.g. [1, 1, 2.5] means the first and second frames last one second,
@@ -63,6 +258,12 @@ class PygAnimation(object):
         # if the sprites are transformed, the originals are kept in _images
         # and the transformed sprites are kept in _transformedImages.
         self._transformedImages = []
+        # _transformState is the transformCache state _transformedImages
+        # holds, _baseState when there are no transforms. _transformFrom is
+        # the (state, op) it was made from, or None if that isn't known.
+        self._baseState = transformCache.newState()
+        self._transformState = self._baseState
+        self._transformFrom = None
 
         self._state = STOPPED # The state is always either PLAYING, PAUSED, or STOPPED
         self._loop = loop # If True, the animation will keep looping. If False, the animation stops after playing once.
@@ -72,22 +273,54 @@ class PygAnimation(object):
         self._playingStartTime = 0 # the time that the play() function was last called.
         self._pausedStartTime = 0 # the time that the pause() function was last called.
 
+        # surfaceCache keys this animation holds a reference to
+        self._cacheKeys = []
+
+        self._clock = clock if clock is not None else _defaultClock
+
         if frames != '_copy': # ('_copy' is passed for frames by the getCopies() method)
             self.numFrames = len(frames)
             assert self.numFrames > 0, 'Must contain at least one frame.'
+            loaded = {} # filename -> Surface, so a sheet is only loaded once
             for i in range(self.numFrames):
                 # load each frame of animation into _images
                 frame = frames[i]
                 assert type(frame) in (list, tuple) and len(frame) == 2, 'Frame %s has incorrect format.' % (i)
-                assert type(frame[0]) in (str, pygame.Surface), 'Frame %s image must be a string filename or a pygame.Surface' % (i)
+                image, region = frame[0], None
+                if type(image) in (list, tuple):
+                    assert len(image) == 2, 'Frame %s sheet region must be a (sheet, rect) pair.' % (i)
+                    image, region = image
+                assert type(image) in (str, pygame.Surface), 'Frame %s image must be a string filename or a pygame.Surface' % (i)
                 assert frame[1] > 0, 'Frame %s duration must be greater than zero.' % (i)
-                if type(frame[0]) == str:
-                    frame = (pygame.image.load(frame[0]), frame[1])
-                self._images.append(frame[0])
+                if type(image) == str:
+                    if image not in loaded:
+                        if cache:
+                            key, loaded[image] = surfaceCache.acquire(image)
+                            self._cacheKeys.append(key)
+                        else:
+                            loaded[image] = pygame.image.load(image)
+                    image = loaded[image]
+                if region is not None:
+                    image = image.subsurface(region)
+                self._images.append(image)
                 self._durations.append(frame[1])
             self._startTimes = self._getStartTimes()
 
 
+    def __del__(self):
+        self.releaseCache()
+
+
+    def releaseCache(self):
+        # Gives back this animation's references to the shared surface cache.
+        # Called automatically when the animation is garbage collected.
+        keys, self._cacheKeys = self._cacheKeys, []
+        if surfaceCache is None: # interpreter shutdown
+            return
+        for key in keys:
+            surfaceCache.release(key)
+
+
     def _getStartTimes(self):
         # Internal method to get the start times based off of the _durations list.
         # Don't call this method.
@@ -103,6 +336,7 @@ class PygAnimation(object):
         self._images.reverse()
         self._transformedImages.reverse()
         self._durations.reverse()
+        self._forgetVariants()
 
 
     def getCopy(self):
@@ -114,12 +348,18 @@ class PygAnimation(object):
 
         retval = []
         for i in range(numCopies):
-            newAnim = PygAnimation('_copy', loop=self.loop)
+            newAnim = PygAnimation('_copy', loop=self.loop, clock=self._clock)
             newAnim._images = self._images[:]
             newAnim._transformedImages = self._transformedImages[:]
+            newAnim._baseState = self._baseState
+            newAnim._transformState = self._transformState
+            newAnim._transformFrom = self._transformFrom
             newAnim._durations = self._durations[:]
             newAnim._startTimes = self._startTimes[:]
             newAnim.numFrames = self.numFrames
+            for key in self._cacheKeys:
+                surfaceCache.acquire(key)
+                newAnim._cacheKeys.append(key)
             retval.append(newAnim)
         return retval
 
@@ -150,11 +390,15 @@ class PygAnimation(object):
     def clearTransforms(self):
 
         self._transformedImages = []
+        self._transformState = self._baseState
+        self._transformFrom = None
 
     def makeTransformsPermanent(self):
+        import pygame
         self._images = [pygame.Surface(surfObj.get_size(), 0, surfObj) for surfObj in self._transformedImages]
         for i in range(len(self._transformedImages)):
             self._images[i].blit(self._transformedImages[i], (0,0))
+        self._forgetVariants()
 
     def blitFrameNum(self, frameNum, destSurface, dest):
 
@@ -184,7 +428,7 @@ class PygAnimation(object):
 
 
         if startTime is None:
-            startTime = time.time()
+            startTime = self._clock()
 
         if self._state == PLAYING:
             if self.isFinished():
@@ -203,14 +447,14 @@ class PygAnimation(object):
 
 
         if startTime is None:
-            startTime = time.time()
+            startTime = self._clock()
 
         if self._state == PAUSED:
             return
         elif self._state == PLAYING:
             self._pausedStartTime = startTime
         elif self._state == STOPPED:
-            rightNow = time.time()
+            rightNow = self._clock()
             self._playingStartTime = rightNow
             self._pausedStartTime = rightNow
         self._state = PAUSED
@@ -260,18 +504,19 @@ class PygAnimation(object):
 
 
     def getRect(self):
-
+        import pygame
         maxWidth, maxHeight = self.getMaxSize()
         return pygame.Rect(0, 0, maxWidth, maxHeight)
 
 
     def anchor(self, anchorPoint=NORTHWEST):
-
+        import pygame
         if self.areFramesSameSize():
             return # nothing needs to be anchored
 
 
         self.clearTransforms() # clears transforms since this method anchors the original images.
+        self._forgetVariants()
 
         maxWidth, maxHeight = self.getMaxSize()
         halfMaxWidth = int(maxWidth / 2)
@@ -340,62 +585,107 @@ class PygAnimation(object):
         else:
             self.elapsed += seconds
 
-    def _makeTransformedSurfacesIfNeeded(self):
-        # Internal-method. Creates the Surface objects for the _transformedImages list.
-        # Don't call this method.
-        if self._transformedImages == []:
-            self._transformedImages = [surf.copy() for surf in self._images]
+    def _transform(self, op, func):
+        # Internal-method. Applies func to every current frame, reusing the
+        # frames from transformCache if this transform of this state was
+        # made before. Don't call this method.
+        if op[0] == 'flip' and not (op[1] or op[2]):
+            return
+        frames = [self.getFrame(i) for i in range(len(self._images))]
+        made = self._transformFrom
+        if made is not None and made[1] == op and op[0] == 'flip':
+            # flipping the same way again gives back the frames before
+            self._showState(made[0], lambda: [func(surf) for surf in frames])
+            return
+        source = self._transformState
+        target = transformCache.lookup(source, op)
+        entry = transformCache.get(target) if target is not None else None
+        if entry is None:
+            target = transformCache.newState()
+            entry = ([func(surf) for surf in frames], 0, source, op)
+            transformCache.put(target, entry[0], source, op)
+        self._transformedImages = entry[0][:]
+        self._transformState = target
+        self._transformFrom = (source, op)
+
+
+    def _showState(self, state, makeFrames):
+        # Internal-method. Switches to state, calling makeFrames for its
+        # frames if they are no longer kept. Don't call this method.
+        if state == self._baseState:
+            self.clearTransforms()
+            return
+        entry = transformCache.get(state)
+        if entry is None:
+            entry = (makeFrames(), 0, None, None)
+            transformCache.put(state, entry[0])
+        self._transformedImages = entry[0][:]
+        self._transformState = state
+        self._transformFrom = (entry[2], entry[3]) if entry[2] is not None else None
+
+
+    def _forgetVariants(self):
+        # Internal-method. Called when the frames the memoized variants were
+        # made from change. Don't call this method.
+        self._baseState = transformCache.newState()
+        self._transformState = transformCache.newState() if self._transformedImages else self._baseState
+        self._transformFrom = None
 
 
     # Transformation methods.
     # (These are analogous to the pygame.transform.* functions, except they
     # are applied to all frames of the animation object.
+    # Each one applies to the current (possibly already transformed) frames.
+    # The results are memoized in transformCache, up to TRANSFORM_BUDGET bytes
+    # for all animations, so flipping between a few variants, e.g. clearTransforms() then
+    # scale() or rotate() with one of a handful of values, only transforms
+    # each variant once.
     def flip(self, xbool, ybool):
         # Flips the image horizontally, vertically, or both.
         # See http://pygame.org/docs/ref/transform.html#pygame.transform.flip
-        self._makeTransformedSurfacesIfNeeded()
-        for i in range(len(self._images)):
-            self._transformedImages[i] = pygame.transform.flip(self.getFrame(i), xbool, ybool)
+        import pygame
+        self._transform(('flip', bool(xbool), bool(ybool)),
+                        lambda surf: pygame.transform.flip(surf, xbool, ybool))
 
 
     def scale(self, width_height):
-
-        self._makeTransformedSurfacesIfNeeded()
-        for i in range(len(self._images)):
-            self._transformedImages[i] = pygame.transform.scale(self.getFrame(i), width_height)
+        import pygame
+        self._transform(('scale', tuple(width_height)),
+                        lambda surf: pygame.transform.scale(surf, width_height))
 
 
     def rotate(self, angle):
         # Rotates the image.
         # See http://pygame.org/docs/ref/transform.html#pygame.transform.rotate
-        self._makeTransformedSurfacesIfNeeded()
-        for i in range(len(self._images)):
-            self._transformedImages[i] = pygame.transform.rotate(self.getFrame(i), angle)
+        import pygame
+        self._transform(('rotate', angle),
+                        lambda surf: pygame.transform.rotate(surf, angle))
 
 
     def rotozoom(self, angle, scale):
         # Rotates and scales the image simultaneously.
         # See http://pygame.org/docs/ref/transform.html#pygame.transform.rotozoom
-        self._makeTransformedSurfacesIfNeeded()
-        for i in range(len(self._images)):
-            self._transformedImages[i] = pygame.transform.rotozoom(self.getFrame(i), angle, scale)
+        import pygame
+        self._transform(('rotozoom', angle, scale),
+                        lambda surf: pygame.transform.rotozoom(surf, angle, scale))
 
 
     def scale2x(self):
-
-        self._makeTransformedSurfacesIfNeeded()
-        for i in range(len(self._images)):
-            self._transformedImages[i] = pygame.transform.scale2x(self.getFrame(i))
+        import pygame
+        self._transform(('scale2x',), pygame.transform.scale2x)
 
 
     def smoothscale(self, width_height):
-
-        self._makeTransformedSurfacesIfNeeded()
-        for i in range(len(self._images)):
-            self._transformedImages[i] = pygame.transform.smoothscale(self.getFrame(i), width_height)
+        import pygame
+        self._transform(('smoothscale', tuple(width_height)),
+                        lambda surf: pygame.transform.smoothscale(surf, width_height))
 
     def _surfaceMethodWrapper(self, wrappedMethodName, *args, **kwargs):
-        self._makeTransformedSurfacesIfNeeded()
+        # These change the frames in place, so work on private copies that
+        # can't be shared with a memoized variant, and start a new state.
+        self._transformedImages = [surf.copy() for surf in (self._transformedImages or self._images)]
+        self._transformState = transformCache.newState()
+        self._transformFrom = None
         for i in range(len(self._images)):
             methodToCall = getattr(self._transformedImages[i], wrappedMethodName)
             methodToCall(*args, **kwargs)
@@ -444,6 +734,19 @@ class PygAnimation(object):
 
 
     # Getter and setter methods for properties
+    def _propGetClock(self):
+        return self._clock
+
+    def _propSetClock(self, clock):
+        # Keeps the animation at the same point when switching clocks.
+        elapsed = self.elapsed if self._state != STOPPED else None
+        self._clock = clock if clock is not None else _defaultClock
+        if elapsed is not None:
+            self.elapsed = elapsed - 0.00001
+
+    clock = property(_propGetClock, _propSetClock)
+
+
     def _propGetRate(self):
         return self._rate
 
@@ -462,7 +765,7 @@ class PygAnimation(object):
     def _propSetLoop(self, loop):
         if self.state == PLAYING and self._loop and not loop:
 
-            self._playingStartTime = time.time() - self.elapsed
+            self._playingStartTime = self._clock() - self.elapsed
         self._loop = bool(loop)
 
     loop = property(_propGetLoop, _propSetLoop)
@@ -505,7 +808,7 @@ class PygAnimation(object):
         else:
             elapsed = getInBetweenValue(0, elapsed, self._startTimes[-1])
 
-        rightNow = time.time()
+        rightNow = self._clock()
         self._playingStartTime = rightNow - (elapsed * self.rate)
 
         if self.state in (PAUSED, STOPPED):
@@ -521,7 +824,7 @@ class PygAnimation(object):
 
         if self._state == PLAYING:
 
-            elapsed = (time.time() - self._playingStartTime) * self.rate
+            elapsed = (self._clock() - self._playingStartTime) * self.rate
         elif self._state == PAUSED:
             # if paused, then draw the frame that was playing at the time the
             # PygAnimation object was paused
@@ -554,11 +857,18 @@ class PygAnimation(object):
 
 
 class PygConductor(object):
-    def __init__(self, *animations):
+    def __init__(self, *animations, **kwargs):
+        # Accepts clock=<callable> like PygAnimation; when given, it is also
+        # handed to every animation so they all share it.
         assert len(animations) > 0, 'at least one PygAnimation object is required'
 
         self._animations = []
         self.add(*animations)
+        clock = kwargs.get('clock')
+        self._clock = clock if clock is not None else _defaultClock
+        if clock is not None:
+            for animObj in self._animations:
+                animObj.clock = clock
 
 
     def add(self, *animations):
@@ -582,14 +892,14 @@ class PygConductor(object):
 
     def play(self, startTime=None):
         if startTime is None:
-            startTime = time.time()
+            startTime = self._clock()
 
         for animObj in self._animations:
             animObj.play(startTime)
 
     def pause(self, startTime=None):
         if startTime is None:
-            startTime = time.time()
+            startTime = self._clock()
 
         for animObj in self._animations:
             animObj.pause(startTime)
@@ -687,6 +997,24 @@ class PygConductor(object):
             animObj.unlock()
 
 
+def sheetFrames(sheet, frameSize, durations, columns=None, start=0):
+    # Returns a frames list for PygAnimation that cuts len(durations) frames
+    # of frameSize out of a sprite sheet, row by row from left to right,
+    # beginning with the start-th cell. A sheet given as a filename has to be
+    # told how many columns it has; a Surface defaults to as many as fit.
+    # e.g. PygAnimation(sheetFrames('hero.png', (22, 32), [0.1] * 5, columns=5))
+    import pygame
+    width, height = frameSize
+    if columns is None:
+        assert type(sheet) == pygame.Surface, 'columns is required when the sheet is a filename.'
+        columns = sheet.get_width() // width
+    frames = []
+    for i, duration in enumerate(durations):
+        row, col = divmod(start + i, columns)
+        frames.append(((sheet, (col * width, row * height, width, height)), duration))
+    return frames
+
+
 def getInBetweenValue(lowerBound, value, upperBound):
 
     if value < lowerBound:
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Recordings of the per-tick (left, right, up) input of a play session.
+# Each run of ticks with the same keys held is one varint: the run length
+# shifted left by three bits, or'd with the key bits. A minute of ordinary
+# play takes a few hundred bytes. Every CHECKPOINT_TICKS ticks, and after
+# the last one, a CRC-32 of the hero's state is stored so a replay can tell
+# exactly where it stopped matching (see headless.replay).
+
+import struct
+import zlib
+
+MAGIC = b"RPLY"
+VERSION = 1
+CHECKPOINT_TICKS = 600
+
+# magic, version, tick rate, ticks, checkpoint interval, then the hero's
+# starting x, y, yvel and flags; the level name follows it
+HEADER = struct.Struct("<4sHHIHiidB")
+STATE = struct.Struct("<iiddB")
+
+LEFT, RIGHT, UP = 1, 2, 4
+# header flags: the hero started on the ground, it used swept collision
+ON_GROUND, SWEPT = 1, 2
+
+
+class ReplayError(Exception):
+    pass
+
+
+def state_hash(hero):
+    return zlib.crc32(STATE.pack(hero.rect.x, hero.rect.y, hero.xvel, hero.yvel, hero.onGround))
+
+
+def pack_keys(left, right, up):
+    return (LEFT if left else 0) | (RIGHT if right else 0) | (UP if up else 0)
+
+
+def unpack_keys(keys):
+    return (bool(keys & LEFT), bool(keys & RIGHT), bool(keys & UP))
+
+
+def write_varint(out, value):
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, pos):
+    value = shift = 0
+    while True:
+        if pos >= len(data):
+            raise ReplayError("truncated recording")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+class Recording(object):
+    def __init__(self, level, start, tick_rate, runs, checkpoints, interval=CHECKPOINT_TICKS,
+                 swept=False):
+        # start is the hero's (x, y, yvel, onGround) when recording began,
+        # runs a list of (ticks, keys) and checkpoints the state hashes.
+        self.level = level
+        self.start = start
+        self.swept = swept
+        self.tick_rate = tick_rate
+        self.runs = runs
+        self.checkpoints = checkpoints
+        self.interval = interval
+        self.ticks = sum(count for count, _ in runs)
+
+    def inputs(self):
+        for count, keys in self.runs:
+            state = unpack_keys(keys)
+            for _ in range(count):
+                yield state
+
+    def checkpoint_ticks(self):
+        # the ticks after which checkpoints were taken, in order
+        ticks = list(range(self.interval, self.ticks + 1, self.interval))
+        if self.ticks % self.interval:
+            ticks.append(self.ticks)
+        return ticks
+
+    def to_bytes(self):
+        x, y, yvel, onGround = self.start
+        name = self.level.encode("utf-8")
+        flags = (ON_GROUND if onGround else 0) | (SWEPT if self.swept else 0)
+        out = bytearray(HEADER.pack(MAGIC, VERSION, self.tick_rate, self.ticks, self.interval,
+                                    x, y, yvel, flags))
+        write_varint(out, len(name))
+        out += name
+        for count, keys in self.runs:
+            write_varint(out, count << 3 | keys)
+        out += struct.pack("<%dI" % len(self.checkpoints), *self.checkpoints)
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) < HEADER.size:
+            raise ReplayError("not a recording")
+        magic, version, tick_rate, ticks, interval, x, y, yvel, flags = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ReplayError("not a recording")
+        if version != VERSION:
+            raise ReplayError("unsupported recording version %d" % version)
+        size, pos = read_varint(data, HEADER.size)
+        level = data[pos:pos + size].decode("utf-8")
+        pos += size
+        runs = []
+        total = 0
+        while total < ticks:
+            run, pos = read_varint(data, pos)
+            runs.append((run >> 3, run & 7))
+            total += run >> 3
+        count = (len(data) - pos) // 4
+        checkpoints = list(struct.unpack_from("<%dI" % count, data, pos))
+        recording = cls(level, (x, y, yvel, bool(flags & ON_GROUND)), tick_rate, runs, checkpoints,
+                        interval, bool(flags & SWEPT))
+        if total != ticks or len(checkpoints) != len(recording.checkpoint_ticks()):
+            raise ReplayError("corrupt recording")
+        return recording
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+class Recorder(object):
+    # Call tick() once per simulation step, after the hero has been updated
+    # with the keys it was given.
+    def __init__(self, level, hero, tick_rate, interval=CHECKPOINT_TICKS):
+        self.level = level
+        self.start = (hero.rect.x, hero.rect.y, hero.yvel, hero.onGround)
+        self.swept = hero.swept
+        self.tick_rate = tick_rate
+        self.interval = interval
+        self.runs = []
+        self.checkpoints = []
+        self.ticks = 0
+        self._hero = hero
+
+    def tick(self, left, right, up, hero):
+        keys = pack_keys(left, right, up)
+        if self.runs and self.runs[-1][1] == keys:
+            self.runs[-1][0] += 1
+        else:
+            self.runs.append([1, keys])
+        self.ticks += 1
+        self._hero = hero
+        if self.ticks % self.interval == 0:
+            self.checkpoints.append(state_hash(hero))
+
+    def finish(self):
+        checkpoints = self.checkpoints[:]
+        if self.ticks % self.interval:
+            checkpoints.append(state_hash(self._hero))
+        return Recording(self.level, self.start, self.tick_rate,
+                         [tuple(run) for run in self.runs], checkpoints, self.interval, self.swept)
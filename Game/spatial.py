@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+CELL_SIZE = 256
+
+
+class SpatialHash(object):
+    # Buckets sprites by the CELL_SIZE cells their rect covers so the draw
+    # loop only has to look at the sprites near the camera.
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.buckets = {}
+        self.keys = {}
+        self.order = {}
+        self.dynamic = set()
+        self.culled = 0
+
+    def _keys(self, rect):
+        size = self.cell_size
+        return (rect.left // size, rect.top // size,
+                (rect.right - 1) // size, (rect.bottom - 1) // size)
+
+    def _cells(self, keys):
+        left, top, right, bottom = keys
+        for cy in range(top, bottom + 1):
+            for cx in range(left, right + 1):
+                yield cx, cy
+
+    def add(self, sprite, dynamic=False):
+        # dynamic sprites move between ticks and get interpolated when drawn
+        keys = self._keys(sprite.rect)
+        if dynamic:
+            self.dynamic.add(sprite)
+        self.keys[sprite] = keys
+        self.order[sprite] = len(self.order)
+        for cell in self._cells(keys):
+            self.buckets.setdefault(cell, []).append(sprite)
+
+    def remove(self, sprite):
+        for cell in self._cells(self.keys.pop(sprite)):
+            bucket = self.buckets[cell]
+            bucket.remove(sprite)
+            if not bucket:
+                del self.buckets[cell]
+        del self.order[sprite]
+        self.dynamic.discard(sprite)
+
+    def move(self, sprite):
+        # Dynamic sprites call this after moving; it only touches the
+        # buckets when the sprite actually crossed a cell boundary.
+        keys = self._keys(sprite.rect)
+        old = self.keys[sprite]
+        if keys == old:
+            return
+        for cell in self._cells(old):
+            bucket = self.buckets[cell]
+            bucket.remove(sprite)
+            if not bucket:
+                del self.buckets[cell]
+        for cell in self._cells(keys):
+            self.buckets.setdefault(cell, []).append(sprite)
+        self.keys[sprite] = keys
+
+    def cull(self, viewport):
+        # Counts the sprites outside viewport into culled; call once a frame
+        # with the camera viewport. Kept apart from query(), which a frame
+        # may call once per dirty rect.
+        self.culled = len(self.order) - len(self._find(viewport))
+
+    def _find(self, rect):
+        found = set()
+        for cell in self._cells(self._keys(rect)):
+            for sprite in self.buckets.get(cell, ()):
+                if sprite not in found and sprite.rect.colliderect(rect):
+                    found.add(sprite)
+        return found
+
+    def query(self, rect):
+        # Sprites whose rect intersects rect, in the order they were added
+        # so overlapping sprites keep their draw order.
+        return sorted(self._find(rect), key=self.order.__getitem__)
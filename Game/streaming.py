@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from pygame import Rect, SRCALPHA, Surface, display, transform
+from assets import registry
+from blocks import BLOCKS
+from tiles import PLATFORM_WIDTH, PLATFORM_HEIGHT
+from tilegrid import TileGrid
+
+CHUNK_CELLS = 16
+STREAM_RADIUS = 2
+
+
+class Chunk(object):
+    # Built on the streaming worker thread, so it only blits from tiles, the
+    # tile Surfaces by level character, and never goes through the registry.
+    # Without tiles only the collision grid is built and image is None.
+    def __init__(self, level, cx, cy, cells, tiles):
+        x, y = cx * cells, cy * cells
+        region = level.region(x, y, cells, cells)
+        self.grid = TileGrid(region, origin=(x, y))
+        self.image = None
+        if tiles is not None:
+            self.image = Surface((cells * PLATFORM_WIDTH, cells * PLATFORM_HEIGHT), SRCALPHA)
+            self.image.fill((0, 0, 0, 0))
+            for col_x, col_y, col in region.solid_cells():
+                self.image.blit(tiles[col], (col_x * PLATFORM_WIDTH, col_y * PLATFORM_HEIGHT))
+        self.converted = False
+        # smaller copies of image by factor, for lower resolution frames
+        self.scaled = {}
+
+
+class StreamingLevel(object):
+    # Keeps only the chunks within radius of the camera target resident.
+    # A worker thread loads chunks ahead of the hero and update() evicts the
+    # ones left behind, so memory stays bounded whatever the level size.
+    # collide() and draw() load any chunk they touch that isn't resident
+    # yet, so callers see the same API as TileGrid/StaticLayer. With
+    # images=False (nothing will draw it) chunks carry only collision.
+    def __init__(self, level, chunk_cells=CHUNK_CELLS, radius=STREAM_RADIUS, images=True):
+        self.level = level
+        self.chunk_cells = chunk_cells
+        self.radius = radius
+        self.cols = (level.width + chunk_cells - 1) // chunk_cells
+        self.rows = (level.height + chunk_cells - 1) // chunk_cells
+        self.chunk_width = chunk_cells * PLATFORM_WIDTH
+        self.chunk_height = chunk_cells * PLATFORM_HEIGHT
+        self.chunks = {}
+        self.wanted = set()
+        # keys on the queue and not yet picked up by the worker
+        self.queued = set()
+        self.loads = 0
+        self.evictions = 0
+        # decode and convert the tiles here, not on the worker thread
+        self.tiles = None
+        if images:
+            self.tiles = dict((col, registry.image(block.IMAGE, alpha=False))
+                              for col, block in BLOCKS.items())
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def _run(self):
+        while True:
+            key = self._queue.get()
+            if key is None:
+                return
+            with self._lock:
+                self.queued.discard(key)
+                if key in self.chunks or key not in self.wanted:
+                    continue
+            self._load(key)
+
+    def _load(self, key):
+        chunk = Chunk(self.level, key[0], key[1], self.chunk_cells, self.tiles)
+        with self._lock:
+            if key not in self.chunks:
+                self.chunks[key] = chunk
+                self.loads += 1
+            return self.chunks[key]
+
+    def chunk(self, key):
+        with self._lock:
+            chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self._load(key)
+        return chunk
+
+    def _chunk_range(self, rect):
+        left = max(0, rect.left // self.chunk_width)
+        right = min(self.cols - 1, (rect.right - 1) // self.chunk_width)
+        top = max(0, rect.top // self.chunk_height)
+        bottom = min(self.rows - 1, (rect.bottom - 1) // self.chunk_height)
+        return left, top, right, bottom
+
+    def update(self, target):
+        cx = target.centerx // self.chunk_width
+        cy = target.centery // self.chunk_height
+        r = self.radius
+        wanted = set((x, y)
+                     for y in range(max(0, cy - r), min(self.rows, cy + r + 1))
+                     for x in range(max(0, cx - r), min(self.cols, cx + r + 1)))
+        with self._lock:
+            self.wanted = wanted
+            # one chunk of slack so walking along a boundary doesn't thrash
+            for key in list(self.chunks):
+                if abs(key[0] - cx) > r + 1 or abs(key[1] - cy) > r + 1:
+                    del self.chunks[key]
+                    self.evictions += 1
+            missing = [key for key in wanted
+                       if key not in self.chunks and key not in self.queued]
+            self.queued.update(missing)
+        for key in missing:
+            self._queue.put(key)
+
+    def close(self):
+        self._queue.put(None)
+
+    def sweep(self, rect, dx, dy):
+        # Same contract as TileGrid.sweep; the nearest hit over every chunk
+        # the move passes through.
+        best = dx or dy
+        left, top, right, bottom = self._chunk_range(rect.union(rect.move(dx, dy)))
+        for y in range(top, bottom + 1):
+            for x in range(left, right + 1):
+                travel = self.chunk((x, y)).grid.sweep(rect, dx, dy)
+                if abs(travel) < abs(best):
+                    best = travel
+        return best
+
+    def collide(self, rect):
+        # Same contract as TileGrid.collide, across every chunk under rect.
+        last = None
+        while True:
+            hit = None
+            left, top, right, bottom = self._chunk_range(rect)
+            for y in range(top, bottom + 1):
+                for x in range(left, right + 1):
+                    grid = self.chunk((x, y)).grid
+                    for i in grid.overlapping(rect):
+                        c = grid.colliders[i]
+                        key = (c.top, c.left)
+                        if (last is None or key > last) and (hit is None or key < hit[0]):
+                            hit = key, c
+            if hit is None:
+                return
+            last = hit[0]
+            yield hit[1]
+
+    def draw(self, surface, camera, factor=1):
+        # Same contract as StaticLayer.draw.
+        ox, oy = camera.topleft
+        w, h = surface.get_size()
+        left, top, right, bottom = self._chunk_range(Rect(-ox, -oy, w * factor, h * factor))
+        for y in range(top, bottom + 1):
+            for x in range(left, right + 1):
+                chunk = self.chunk((x, y))
+                if not chunk.converted and display.get_surface() is not None:
+                    chunk.image = chunk.image.convert_alpha()
+                    chunk.converted = True
+                image = chunk.image
+                if factor != 1:
+                    image = chunk.scaled.get(factor)
+                    if image is None:
+                        image = transform.scale(chunk.image, (self.chunk_width // factor,
+                                                              self.chunk_height // factor))
+                        chunk.scaled[factor] = image
+                surface.blit(image, ((x * self.chunk_width + ox) // factor,
+                                     (y * self.chunk_height + oy) // factor))
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from pygame import Rect
+from tiles import PLATFORM_WIDTH, PLATFORM_HEIGHT
+
+
+class TileGrid(object):
+    # Collision index over the level cells. A rect only ever touches the
+    # handful of cells under it, so lookups are plain arithmetic on
+    # PLATFORM_WIDTH/PLATFORM_HEIGHT instead of a scan over every platform.
+    #
+    # With merge on, the level is compiled into maximal rectangles first:
+    # solid cells are run-length merged along each row, then runs with the
+    # same span on consecutive rows are merged down the column. A wall or a
+    # long ledge becomes a single collider, so the player resolves against
+    # it once per contact instead of once per tile.
+    #
+    # origin places the grid inside a larger level (in cells), which is how
+    # the streaming loader builds one grid per chunk.
+    def __init__(self, level, merge=True, origin=(0, 0)):
+        self.width = level.width
+        self.height = level.height
+        self.ox, self.oy = origin
+        self.owner = [-1] * (self.width * self.height)
+        self.colliders = []
+
+        spans = {}
+        for y in range(level.height):
+            open_spans = {}
+            for x0, x1 in self._runs(level, y, merge):
+                span = spans.get((x0, x1)) if merge else None
+                if span is None:
+                    span = len(self.colliders)
+                    self.colliders.append(Rect((self.ox + x0) * PLATFORM_WIDTH,
+                                               (self.oy + y) * PLATFORM_HEIGHT,
+                                               (x1 - x0) * PLATFORM_WIDTH, PLATFORM_HEIGHT))
+                else:
+                    self.colliders[span].height += PLATFORM_HEIGHT
+                open_spans[(x0, x1)] = span
+                base = y * self.width
+                for x in range(x0, x1):
+                    self.owner[base + x] = span
+            spans = open_spans
+
+    def _runs(self, level, y, merge):
+        for start, end in level.runs(y):
+            if merge:
+                yield start, end
+            else:
+                for x in range(start, end):
+                    yield x, x + 1
+
+    def update(self, target):
+        # The whole level is always resident; see StreamingLevel.update.
+        pass
+
+    def cell_range(self, rect):
+        left = max(0, rect.left // PLATFORM_WIDTH - self.ox)
+        right = min(self.width - 1, (rect.right - 1) // PLATFORM_WIDTH - self.ox)
+        top = max(0, rect.top // PLATFORM_HEIGHT - self.oy)
+        bottom = min(self.height - 1, (rect.bottom - 1) // PLATFORM_HEIGHT - self.oy)
+        return left, top, right, bottom
+
+    def overlapping(self, rect):
+        # Indices of the colliders overlapping rect right now.
+        found = set()
+        left, top, right, bottom = self.cell_range(rect)
+        for y in range(top, bottom + 1):
+            base = y * self.width
+            for x in range(left, right + 1):
+                i = self.owner[base + x]
+                if i >= 0:
+                    found.add(i)
+        return found
+
+    def sweep(self, rect, dx, dy):
+        # How far rect can move by dx or dy (the other one zero) before its
+        # leading edge touches a solid cell; the whole way if nothing is in
+        # the way. The rows (or columns) of cells ahead of the edge are walked
+        # nearest first, so nothing is skipped however far the move. Cells
+        # rect already overlaps don't stop it, collide() resolves those.
+        if dy:
+            left, _, right, _ = self.cell_range(rect)
+            for y, travel in _ahead(rect.top, rect.bottom, dy, PLATFORM_HEIGHT, self.oy, self.height):
+                base = y * self.width
+                for x in range(left, right + 1):
+                    if self.owner[base + x] >= 0:
+                        return travel
+            return dy
+        _, top, _, bottom = self.cell_range(rect)
+        for x, travel in _ahead(rect.left, rect.right, dx, PLATFORM_WIDTH, self.ox, self.width):
+            for y in range(top, bottom + 1):
+                if self.owner[y * self.width + x] >= 0:
+                    return travel
+        return dx
+
+    def collide(self, rect):
+        # Yields the colliders overlapping rect, ordered by their top-left
+        # cell (row-major, the order the level was built in). rect is
+        # re-read after every yield, so the caller may move it while
+        # resolving a hit and the remaining colliders are tested against the
+        # new position, like the old linear scan over the platforms list.
+        last = -1
+        while True:
+            hit = None
+            left, top, right, bottom = self.cell_range(rect)
+            for y in range(top, bottom + 1):
+                base = y * self.width
+                for x in range(left, right + 1):
+                    i = self.owner[base + x]
+                    if i > last and (hit is None or i < hit):
+                        hit = i
+            if hit is None:
+                return
+            last = hit
+            yield self.colliders[hit]
+
+
+def _ahead(low, high, distance, size, origin, count):
+    # (grid index, travel to contact) of each line of cells the edge of a
+    # span from low to high meets moving by distance, nearest first.
+    last = origin + count - 1
+    if distance > 0:
+        for line in range(max(-(-high // size), origin), min((high + distance - 1) // size, last) + 1):
+            yield line - origin, line * size - high
+    else:
+        for line in range(min(low // size - 1, last), max((low + distance) // size, origin) - 1, -1):
+            yield line - origin, (line + 1) * size - low
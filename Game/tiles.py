@@ -0,0 +1,18 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Tile geometry and the level legend. Nothing here needs pygame, so level
+# tools can use it without paying for importing it.
+
+PLATFORM_WIDTH = 32
+PLATFORM_HEIGHT = 32
+PLATFORM_COLOR = "#FF6262"
+
+# level character -> image of the block drawn for it
+TILES = {
+    "-": "blocks/platform.png",
+    "*": "blocks/platform_1.png",
+    ">": "blocks/platform_2.png",
+    "<": "blocks/platform_3.png",
+    "^": "blocks/platform_4.png",
+}